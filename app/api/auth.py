@@ -3,13 +3,15 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from typing import Dict, Optional, Any
 from pydantic import BaseModel, EmailStr
 from ..services.auth_service import auth_service
+from ..services.auth_cache import auth_cache
+from ..services.revocation_service import revocation_service
+from ..services.refresh_token_service import refresh_token_service
 from ..services.cache_service import cache_service
 from ..core.config import settings
 import logging
 from datetime import datetime
 from ..services.email_service import email_service
 from ..services.otp_service import otp_service
-from ..core.security import get_password_hash
 from ..models.auth import (
     VerifyEmailRequest,
     ResendVerificationRequest,
@@ -37,32 +39,50 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict:
-    """Get the current authenticated user."""
-    try:
-        # Check if token is blacklisted
-        is_blacklisted = await cache_service.get(f"blacklist:{token}")
-        if is_blacklisted:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has been invalidated",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
-        user_id = auth_service.verify_token(token)
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict:
+    """Get the current authenticated user.
 
-        user = await auth_service.get_user(user_id)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
+    Tokens and profiles seen recently by this process are served from
+    ``auth_cache`` without touching Redis or the database.
+    """
+    try:
+        user_id = auth_cache.get_token(token)
+        if user_id is None:
+            payload = auth_service.decode_token(token)
+            user_id = payload.get("sub") if payload else None
+            if not user_id:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid authentication credentials",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+
+            # Check if token is revoked; tokens issued before jti are in the blacklist
+            jti = payload.get("jti")
+            if jti:
+                is_revoked = await revocation_service.is_revoked(jti)
+            else:
+                is_revoked = await cache_service.get(f"blacklist:{token}")
+            if is_revoked:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token has been invalidated",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            auth_cache.put_token(token, user_id, payload.get("exp"))
+
+        user = auth_cache.get_user(user_id)
+        if user is None:
+            user = await auth_service.get_user(user_id)
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
+                )
+            auth_cache.put_user(user_id, user)
 
         return user
 
@@ -128,15 +148,47 @@ async def login(
             detail=str(e)
         )
 
+@router.post("/refresh")
+async def refresh(request: RefreshRequest):
+    """Exchange a refresh token for a new access token and refresh token.
+
+    Each refresh token works once. Presenting one that was already used
+    revokes every token descended from the same login.
+    """
+    try:
+        return await auth_service.refresh_tokens(request.refresh_token)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except Exception as e:
+        logger.error(f"Error during token refresh: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while refreshing the token"
+        )
+
 @router.post("/logout")
-async def logout(current_user: Dict = Depends(get_current_user), token: str = Depends(oauth2_scheme)):
-    """Logout a user by blacklisting their token."""
+async def logout(
+    current_user: Dict = Depends(get_current_user),
+    token: str = Depends(oauth2_scheme),
+    refresh_token: Optional[str] = Body(None, embed=True)
+):
+    """Logout a user by revoking their token, and its refresh token if given."""
     try:
-        # Add token to blacklist with expiry matching token expiry
-        token_exp = auth_service.decode_token(token).get("exp")
-        if token_exp:
+        if refresh_token:
+            await refresh_token_service.revoke(refresh_token, current_user["id"])
+        # Revoke the token until it would have expired
+        payload = auth_service.decode_token(token)
+        token_exp = payload.get("exp")
+        if token_exp and payload.get("jti"):
+            await revocation_service.revoke(payload["jti"], token_exp)
+        elif token_exp:
             ttl = token_exp - datetime.utcnow().timestamp()
             await cache_service.set(f"blacklist:{token}", "true", int(ttl))
+        await auth_cache.invalidate(tokens=[token])
         return {"message": "Successfully logged out"}
     except Exception as e:
         logger.error(f"Error during logout: {str(e)}")
@@ -298,9 +350,8 @@ async def reset_password(request: ResetPasswordRequest):
                 detail="Invalid or expired OTP"
             )
 
-        # Update password
-        hashed_password = get_password_hash(request.password)
-        await auth_service.update_user(user.id, {"password": hashed_password})
+        # Update password; update_user hashes it
+        await auth_service.update_user(user.id, {"password": request.password})
 
         # Invalidate OTP
         await otp_service.invalidate_otp(request.email, 'password_reset')
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 import logging
 import io
 from ..services.chat_service import chat_service
+from ..services.content_service import ContentWriteUnavailable
 from .auth import get_current_user
 
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -36,6 +37,8 @@ async def chat_text(
             "success": True,
             "data": response
         }
+    except ContentWriteUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error in chat_text: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -68,6 +71,8 @@ async def chat_voice(
             "success": True,
             "data": response
         }
+    except ContentWriteUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error in chat_voice: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
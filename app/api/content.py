@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import Dict, List, Optional
-from ..services.content_service import content_service
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from typing import Dict, List, Optional, Set
+from ..services.content_service import content_service, load_metadata
+from ..services.search_service import search_service
+from ..services.usage_service import usage_service
 from ..api.auth import get_current_user
 from pydantic import BaseModel, Field
 from datetime import datetime
@@ -23,22 +25,141 @@ class ContentResponse(BaseModel):
             datetime: lambda v: v.isoformat()
         }
 
-@router.get("/", response_model=List[ContentResponse])
+class ContentSummaryResponse(BaseModel):
+    id: str
+    type: str
+    title: str
+    preview: Optional[str] = None
+    filename: Optional[str] = None
+    fileUrl: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
+    # Only present when requested with ``include``
+    content: Optional[str] = None
+    prompt: Optional[str] = None
+    metadata: Optional[Dict] = None
+
+    class Config:
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
+
+SUMMARY_FIELDS = ["id", "type", "title", "preview", "filename", "fileUrl", "createdAt", "updatedAt"]
+
+def _project(content, include: Set[str]) -> Dict:
+    """Keep the summary fields plus whatever was asked for."""
+    item = {field: getattr(content, field) for field in SUMMARY_FIELDS + sorted(include)}
+    if "metadata" in item:
+        item["metadata"] = load_metadata(item["metadata"]) or None
+    return item
+
+@router.get("/", response_model=List[ContentSummaryResponse], response_model_exclude_unset=True)
 async def get_user_content(
+    response: Response,
     content_type: Optional[str] = Query(None, description="Filter by content type (CHAT, PDF, VOICE, FILE)"),
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Deprecated; use cursor"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    include: Optional[str] = Query(None, description="Comma-separated extra fields: content, metadata, prompt"),
     current_user: Dict = Depends(get_current_user)
 ):
-    """Get user's generated content with optional filtering."""
+    """Get user's generated content with optional filtering.
+
+    Items are summaries with a short preview; fetch ``/content/{id}`` for the
+    full body, or name the fields to add with ``include``. When more items
+    exist, the cursor for the next page is returned in the ``X-Next-Cursor`` header.
+    """
     try:
-        contents = await content_service.get_user_content(
+        fields = {field.strip() for field in include.split(",") if field.strip()} if include else set()
+        contents, next_cursor = await content_service.get_user_content(
             user_id=current_user["id"],
             content_type=content_type,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
+            include=fields
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return [_project(content, fields) for content in contents]
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+class SearchResult(ContentSummaryResponse):
+    score: float
+
+@router.get("/search", response_model=List[SearchResult], response_model_exclude_unset=True)
+async def search_content(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find; end a word with * to match prefixes"),
+    content_type: Optional[str] = Query(None, description="Filter by content type (CHAT, PDF, VOICE, FILE)"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Dict = Depends(get_current_user)
+):
+    """Search the user's content, best matches first."""
+    try:
+        hits = await search_service.search(
+            user_id=current_user["id"],
+            query=q,
+            content_type=content_type,
+            limit=limit
+        )
+        scores = dict(hits)
+        # Rows deleted while this process was not following updates are dropped here
+        contents = await content_service.get_user_content_by_ids(current_user["id"], [content_id for content_id, _ in hits])
+        return [{**_project(content, set()), "score": scores[content.id]} for content in contents]
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+class UsageCounters(BaseModel):
+    chat: int
+    voice: int
+    file: int
+    pdf: int
+    tokens: int
+    bytes: int
+
+class UsageBucket(UsageCounters):
+    start: datetime
+
+class UsageStats(BaseModel):
+    totals: UsageCounters
+    hourly: List[UsageBucket]
+    daily: List[UsageBucket]
+
+@router.get("/stats", response_model=UsageStats)
+async def get_usage_stats(
+    hours: int = Query(24, ge=0, description="Hourly buckets to return, newest first"),
+    days: int = Query(30, ge=0, description="Daily buckets to return, newest first"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """Get the user's content counts, estimated tokens and bytes processed.
+
+    Counters are kept as content is saved, so this reads a few Redis hashes
+    rather than counting rows. Buckets are in UTC.
+    """
+    try:
+        return await usage_service.get_stats(current_user["id"], hours=hours, days=days)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
-        return contents
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -53,12 +174,14 @@ async def get_content(
     """Get specific content by ID."""
     try:
         content = await content_service.get_content_by_id(content_id)
-        if not content or content["userId"] != current_user["id"]:
+        if not content or content.userId != current_user["id"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Content not found"
             )
-        return content
+        return _project(content, {"content", "metadata", "prompt"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,9 +1,18 @@
+import io
+import json
 import logging
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from typing import Optional, Dict
+import os
+import uuid
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, Dict, List
+from ..services.content_service import ContentWriteUnavailable
 from ..services.file_service import file_service
+from ..services.extractors import extractor_registry
+from ..services.job_service import job_service
 from ..core.config import settings
 from ..api.auth import get_current_user
+from ..api.jobs import job_links
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,13 +20,52 @@ logger = logging.getLogger(__name__)
 # Initialize router
 router = APIRouter(prefix="/files", tags=["files"])
 
+async def _enqueue_file_job(
+    job_type: str,
+    file_content: bytes,
+    filename: str,
+    user_id: str,
+    model_name: Optional[str]
+) -> JSONResponse:
+    """Stage the upload on disk and queue it for a background worker."""
+    # Reject unsupported content now rather than after a worker has picked it up
+    extractor_registry.resolve(io.BytesIO(file_content), filename, require_text=job_type == "file_process")
+
+    ext = os.path.splitext(filename)[1].lower()
+    staged_path = os.path.join(settings.TEMP_STORAGE_PATH, "jobs", f"{uuid.uuid4().hex}{ext}")
+    os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+    with open(staged_path, "wb") as f:
+        f.write(file_content)
+
+    job = await job_service.enqueue(
+        job_type,
+        payload={
+            "path": staged_path,
+            "filename": filename,
+            "user_id": user_id,
+            "model_name": model_name
+        },
+        user_id=user_id
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "success": True,
+            "data": {"job_id": job["id"], "status": job["status"], **job_links(job["id"])}
+        }
+    )
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
     model_name: Optional[str] = None,
+    background: bool = False,
     current_user: Dict = Depends(get_current_user)
 ):
-    """Upload and process a file (image or text)"""
+    """Upload and process a file (image or text).
+
+    With ``background=true`` the file is queued and a job id is returned immediately.
+    """
     logger.info(f"Received file upload request: {file.filename}")
     if file.size > 20 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File size exceeds the 20MB limit")
@@ -27,6 +75,15 @@ async def upload_file(
         
         # Read file content
         file_content = await file.read()
+
+        if background:
+            return await _enqueue_file_job(
+                "file_upload",
+                file_content,
+                file.filename,
+                str(current_user["id"]),
+                model_name or settings.DEFAULT_MODEL
+            )
         
         # Process the file
         result = await file_service.process_file_with_gemini(
@@ -42,6 +99,8 @@ async def upload_file(
             "data": result
         }
         
+    except ContentWriteUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         logger.error(f"File processing error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -56,9 +115,13 @@ async def upload_file(
 async def process_image(
     file: UploadFile = File(...),
     model_name: Optional[str] = None,
+    background: bool = False,
     current_user: Dict = Depends(get_current_user)
 ):
-    """Process an image file specifically"""
+    """Process an image file specifically.
+
+    With ``background=true`` the file is queued and a job id is returned immediately.
+    """
     try:
         logger.info(f"Received image processing request: {file.filename}")
     
@@ -73,6 +136,15 @@ async def process_image(
                 status_code=400,
                 detail="Image size exceeds the 5MB limit"
             )
+
+        if background:
+            return await _enqueue_file_job(
+                "file_process",
+                file_content,
+                file.filename,
+                str(current_user["id"]),
+                model_name or current_user.get("modelName")
+            )
         
         # Process the image
         result = await file_service.process_file(
@@ -88,6 +160,8 @@ async def process_image(
         logger.info("File processed successfully")
         return result
         
+    except ContentWriteUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         logger.error(f"Image processing error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -96,4 +170,82 @@ async def process_image(
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred while processing the image"
-        )
\ No newline at end of file
+        )
+@router.post("/process-file/stream")
+async def process_file_stream(
+    file: UploadFile = File(...),
+    model_name: Optional[str] = None,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Analyze a file, streaming partial section summaries as server-sent events."""
+    logger.info(f"Received streaming analysis request: {file.filename}")
+    if file.size > 20 * 1024 * 1024:
+        raise HTTPException(status_code=400, detail="File size exceeds the 20MB limit")
+
+    async def event_stream():
+        try:
+            async for event in file_service.stream_file_analysis(
+                file=file.file,
+                filename=file.filename,
+                user_id=str(current_user["id"]),
+                model_name=model_name or current_user.get("modelName")
+            ):
+                yield f"data: {json.dumps(event)}\n\n"
+        except ValueError as e:
+            logger.error(f"File processing error: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+        except Exception as e:
+            logger.error(f"Unexpected error in streaming analysis: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'detail': 'An unexpected error occurred while processing the file'})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    model_name: Optional[str] = None,
+    group: bool = False,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Upload and analyze many files at once, streaming per-file results as server-sent events.
+
+    With ``group=true`` all files are analyzed together in a single model call.
+    """
+    logger.info(f"Received batch upload request with {len(files)} files")
+    if len(files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {settings.BATCH_MAX_FILES} files"
+        )
+    for file in files:
+        if file.size > 20 * 1024 * 1024:
+            raise HTTPException(status_code=400, detail=f"File {file.filename} exceeds the 20MB limit")
+
+    # Uploads are closed once the handler returns, so read them before streaming
+    contents = [(file.filename, await file.read()) for file in files]
+
+    async def event_stream():
+        try:
+            async for event in file_service.process_batch(
+                files=contents,
+                user_id=str(current_user["id"]),
+                model_name=model_name or current_user.get("modelName"),
+                group=group
+            ):
+                yield f"data: {json.dumps(event)}\n\n"
+        except ValueError as e:
+            logger.error(f"Batch processing error: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+        except Exception as e:
+            logger.error(f"Unexpected error in batch processing: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'detail': 'An unexpected error occurred while processing the files'})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
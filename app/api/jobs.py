@@ -0,0 +1,84 @@
+import json
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Dict
+from ..services.job_service import job_service
+from .auth import get_current_user
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def job_links(job_id: str) -> Dict[str, str]:
+    """URLs clients use to follow a queued job."""
+    return {
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events"
+    }
+
+
+def _public_job(job: Dict) -> Dict:
+    return {
+        "id": job["id"],
+        "type": job["type"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+
+async def _get_owned_job(job_id: str, current_user: Dict) -> Dict:
+    job = await job_service.get_job(job_id)
+    if not job or job["user_id"] != str(current_user["id"]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Poll the status of a background job."""
+    job = await _get_owned_job(job_id, current_user)
+    return {
+        "success": True,
+        "data": _public_job(job)
+    }
+
+
+@router.get("/{job_id}/events")
+async def job_events(
+    job_id: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Stream job progress as server-sent events until the job finishes."""
+    await _get_owned_job(job_id, current_user)
+
+    async def event_stream():
+        try:
+            async for event in job_service.stream_events(job_id):
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if "user_id" in event:
+                    event = _public_job(event)
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming job events: {str(e)}")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,11 +1,17 @@
 import os
+import json
 import logging
-from fastapi import APIRouter, HTTPException, Response, Depends
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, status
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional
+from ..core.http_files import conditional_file_response
 from ..services.pdf_service import PDFService
+from ..services.job_service import job_service
+from ..services.content_service import ContentWriteUnavailable
+from ..services.storage_manager import storage_manager, StorageQuotaExceeded
 from .auth import get_current_user
+from .jobs import job_links
 from typing import Dict
 
 
@@ -21,19 +27,46 @@ pdf_service = PDFService()
 class StoryPrompt(BaseModel):
     prompt: str
     model_name: Optional[str] = None
+    # Plan the story and write this many chapters in parallel
+    chapters: Optional[int] = Field(None, ge=2, le=10)
 
 @router.post("/generate-story")
 async def generate_story(
     prompt: StoryPrompt,
+    background: bool = False,
     current_user: Dict = Depends(get_current_user)
 ):
-    """Generate a story PDF from a prompt."""
+    """Generate a story PDF from a prompt.
+
+    With ``background=true`` the story is queued and a job id is returned immediately.
+    """
     try:
+        if background:
+            await storage_manager.check_quota(str(current_user["id"]))
+            job = await job_service.enqueue(
+                "story_pdf",
+                payload={
+                    "prompt": prompt.prompt,
+                    "user_id": str(current_user["id"]),
+                    "model_name": prompt.model_name,
+                    "chapters": prompt.chapters
+                },
+                user_id=str(current_user["id"])
+            )
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={
+                    "success": True,
+                    "data": {"job_id": job["id"], "status": job["status"], **job_links(job["id"])}
+                }
+            )
+
         # Await the PDF generation
         result = await pdf_service.generate_story_pdf(
             prompt=prompt.prompt,
             user_id=str(current_user["id"]),
-            model_name=prompt.model_name
+            model_name=prompt.model_name,
+            chapters=prompt.chapters
         )
 
         return {
@@ -43,19 +76,72 @@ async def generate_story(
                 "url": f"/api/pdf/download/{result['file_id']}"
             }
         }
+    except StorageQuotaExceeded as e:
+        raise HTTPException(status_code=status.HTTP_507_INSUFFICIENT_STORAGE, detail=str(e))
+    except ContentWriteUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to generate story PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/download/{file_id}")
-async def download_pdf(file_id: str):
-    """Download a generated PDF file."""
+@router.post("/generate-story/stream")
+async def generate_story_stream(
+    prompt: StoryPrompt,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Generate a story PDF, streaming progress as server-sent events."""
+    async def event_stream():
+        try:
+            if prompt.chapters:
+                events = pdf_service.stream_planned_story_pdf(
+                    prompt=prompt.prompt,
+                    user_id=str(current_user["id"]),
+                    model_name=prompt.model_name,
+                    chapters=prompt.chapters
+                )
+            else:
+                events = pdf_service.stream_story_pdf(
+                    prompt=prompt.prompt,
+                    user_id=str(current_user["id"]),
+                    model_name=prompt.model_name
+                )
+            async for event in events:
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.error(f"Failed to stream story PDF: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.api_route("/download/{file_id}", methods=["GET", "HEAD"])
+async def download_pdf(file_id: str, request: Request):
+    """Download a generated PDF file.
+
+    Supports ETag/Last-Modified revalidation and single or multi-range requests.
+    PDFs in remote storage are served by redirecting to a presigned URL.
+    """
     try:
+        redirect_url = await pdf_service.get_pdf_redirect(file_id, request.method)
+        if redirect_url:
+            return RedirectResponse(
+                redirect_url,
+                status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+                # The URL expires, so it must not outlive its signature in a cache
+                headers={"Cache-Control": "private, no-store"}
+            )
         file_path = pdf_service.get_pdf_path(file_id)
-        return FileResponse(
+        content_hash = pdf_service.content_hash(file_id)
+        return await conditional_file_response(
+            request,
             file_path,
             media_type="application/pdf",
-            filename=file_id
+            filename=file_id,
+            etag_value=content_hash,
+            immutable=content_hash is not None
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -1,5 +1,5 @@
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -17,6 +17,18 @@ class Settings(BaseSettings):
     
     PDF_STORAGE_PATH: str = "storage/pdfs"
     TEMP_STORAGE_PATH: str = "storage/temp"
+    PDF_STORAGE_BACKEND: str = "local"  # "local" or "s3"
+
+    # S3-compatible PDF storage (AWS S3, MinIO, ...)
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = "pdfs/"
+    S3_ENDPOINT_URL: Optional[str] = None  # e.g. http://localhost:9000 for MinIO
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None  # defaults to the boto3 credential chain
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024
+    S3_PRESIGN_EXPIRY: int = 900  # 15 minutes
 
     # Cache settings
     CACHE_TTL: int = 3600  # 1 hour
@@ -28,6 +40,12 @@ class Settings(BaseSettings):
     
     # Database settings
     MONGODB_URL: str
+    DB_POOL_SIZE: int = 20  # maxPoolSize, unless set in MONGODB_URL
+    DB_MIN_POOL_SIZE: int = 4  # connections kept open while idle
+    DB_CONNECT_TIMEOUT: int = 10  # seconds
+    DB_QUERY_TIMEOUT: float = 30.0  # seconds per query engine request
+    DB_WARMUP_QUERIES: int = 4  # concurrent reads at startup
+    DB_DRAIN_TIMEOUT: float = 10.0  # seconds shutdown waits for running queries
     
     # Redis settings
     REDIS_URL: str
@@ -36,6 +54,8 @@ class Settings(BaseSettings):
     # File upload settings
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: List[str] = [".txt", ".jpg", ".jpeg", ".png", ".pdf"]
+    BATCH_MAX_FILES: int = 50
+    EXTRACT_MAX_CHARS: int = 2_000_000  # extracted text beyond this is dropped
     
     # Email settings
     SMTP_HOST: str
@@ -49,10 +69,114 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
-    
+
+    # Token revocation
+    REVOCATION_BLOOM_CAPACITY: int = 100000  # revoked tokens alive at once
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001  # share of live tokens still checked in Redis
+    REVOCATION_SNAPSHOT_INTERVAL: int = 300  # seconds between filter rebuilds
+
+    # Authenticated-user cache
+    AUTH_CACHE_TTL: int = 60  # seconds; bounds staleness if an invalidation is missed
+    AUTH_CACHE_SIZE: int = 10000  # entries each for tokens and users
+    
+    # Background job settings
+    JOB_BACKEND: str = "redis"  # "redis" or "local" (in-process, for tests)
+    JOB_VISIBILITY_TIMEOUT: int = 300  # seconds before an unacknowledged job is retried
+    JOB_CLAIM_POLL_INTERVAL: float = 0.25  # seconds between checks of an empty queue
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RESULT_TTL: int = 86400  # 1 day
+    JOB_WORKER_PROCESSES: int = 2
+    JOB_WORKER_CONCURRENCY: int = 4  # jobs per worker process
+
+    # CPU worker pool
+    CPU_WORKER_PROCESSES: int = 4
+    CPU_WORKER_MAX_PENDING: int = 64  # queued submissions before callers wait
+
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12  # existing hashes are upgraded at login when this changes
+    PASSWORD_HASH_PROCESSES: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 16  # queued hashes before callers wait
+
+    # PDF rendering
+    PDF_RENDER_PROCESSES: int = 2
+    PDF_RENDER_MAX_PENDING: int = 32
+
+    # Write-behind content saves
+    CONTENT_WRITE_BEHIND: bool = True
+    CONTENT_FLUSH_BATCH: int = 200  # rows per create_many
+    CONTENT_FLUSH_INTERVAL: float = 1.0  # seconds a row may wait in the buffer
+    CONTENT_BUFFER_MAX: int = 10000  # buffered rows before callers wait
+    CONTENT_BACKPRESSURE_TIMEOUT: float = 10.0  # seconds a caller waits before a 503
+    CONTENT_JOURNAL_TTL: int = 30  # seconds before a silent process's journal is replayed
+    CONTENT_RECOVER_INTERVAL: int = 30  # seconds between scans for orphaned journals
+
+    # Content-by-id cache
+    CONTENT_CACHE_TTL: int = 3600
+    CONTENT_CACHE_NEGATIVE_TTL: int = 30  # missing ids
+    CONTENT_CACHE_LOCAL_SIZE: int = 2048  # rows kept in each process
+    CONTENT_CACHE_LOCAL_TTL: int = 60  # bounds staleness if an invalidation is missed
+
+    # Large content bodies, compressed outside the database row
+    CONTENT_OFFLOAD_ENABLED: bool = True
+    CONTENT_OFFLOAD_THRESHOLD: int = 16 * 1024  # characters; smaller bodies stay inline
+    CONTENT_BODY_PATH: str = "storage/bodies"  # local backend
+    S3_BODY_PREFIX: str = "bodies/"  # s3 backend, same bucket as PDFs
+    CONTENT_ZSTD_LEVEL: int = 6
+
+    # Per-user usage counters
+    USAGE_HOURLY_RETENTION: int = 48  # hours of hourly buckets
+    USAGE_DAILY_RETENTION: int = 90  # days of daily buckets
+
+    # Content search
+    SEARCH_INDEX_PATH: str = "storage/search"
+    SEARCH_MAX_LOADED_SHARDS: int = 1000  # per-user indexes kept in memory
+    SEARCH_SAVE_INTERVAL: int = 30  # seconds between saves of changed indexes
+
+    # Storage quotas and maintenance
+    PDF_USER_QUOTA_BYTES: int = 500 * 1024 * 1024  # 500MB per user
+    PDF_STORAGE_MAX_BYTES: int = 20 * 1024 * 1024 * 1024  # 20GB per node
+    STORAGE_MIN_FREE_BYTES: int = 1024 * 1024 * 1024  # refuse new PDFs below 1GB free
+    PDF_RETENTION_DAYS: int = 0  # 0 keeps PDFs forever
+    STORAGE_GC_INTERVAL: int = 60  # seconds between maintenance passes
+    STORAGE_GC_BATCH: int = 200  # files examined per pass and step
+    STORAGE_ORPHAN_GRACE: int = 3600  # seconds before an unreferenced PDF may be removed
+    TEMP_FILE_MAX_AGE: int = 86400  # must outlive a job's retries
+
+    # Planned stories
+    STORY_CHAPTER_CONCURRENCY: int = 5  # chapters written at once
+
+    # Image optimization before upstream upload
+    MEDIA_OPTIMIZE_IMAGES: bool = True
+    MEDIA_MAX_IMAGE_DIMENSION: int = 3072  # longest side, in pixels
+    MEDIA_IMAGE_FORMAT: str = "WEBP"  # "WEBP" or "JPEG"
+    MEDIA_IMAGE_QUALITY: int = 85
+
+    # Large document summarization
+    SUMMARY_CHUNK_TOKENS: int = 6000  # token budget per map/reduce prompt
+    SUMMARY_CONCURRENCY: int = 4  # concurrent model calls per document
+    SUMMARY_CACHE_TTL: int = 7 * 86400  # 7 days
+
     # Rate limiting
-    RATE_LIMIT_REQUESTS: int = 100
-    RATE_LIMIT_WINDOW: int = 3600  # 1 hour
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_REQUESTS: int = 120  # cost units per client per window
+    RATE_LIMIT_WINDOW: int = 60  # seconds
+    # Cost units by path prefix under API_PREFIX; other requests cost 1
+    RATE_LIMIT_COSTS: Dict[str, int] = {
+        "/pdf/generate-story": 20,
+        "/files/batch": 20,
+        "/files/process-file": 10,
+        "/files/upload": 5,
+        "/chat/voice": 5,
+        "/chat/text-to-speech": 5,
+        "/chat/text": 2,
+        "/auth/login": 5,
+        "/auth/signup": 5,
+        "/auth/forgot-password": 5,
+        "/auth/reset-password": 5
+    }
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.05  # seconds before a check falls back to this process
+    RATE_LIMIT_FALLBACK_PERIOD: int = 5  # seconds limited locally after a Redis failure
+    RATE_LIMIT_LOCAL_SIZE: int = 10000  # clients tracked during fallback
     
     # Model settings
     DEFAULT_MODEL: str = "gemini-2.0-flash-exp"
@@ -108,6 +232,9 @@ class Settings(BaseSettings):
     CORS_CREDENTIALS: bool = True
     CORS_METHODS: List[str] = ["*"]
     CORS_HEADERS: List[str] = ["*"]
+    CORS_EXPOSE_HEADERS: List[str] = [
+        "X-Next-Cursor", "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "Retry-After"
+    ]
     ENCRYPTION_KEY: str
     
     class Config:
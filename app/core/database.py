@@ -1,38 +1,111 @@
 from prisma import Prisma
 from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import asyncio
 import logging
+import time
+from .config import settings
 
 logger = logging.getLogger(__name__)
 
+def _datasource_url(url: str) -> str:
+    """Add pool and timeout options to the MongoDB URL, keeping any set explicitly."""
+    parts = urlsplit(url)
+    options = dict(parse_qsl(parts.query))
+    defaults = {
+        "maxPoolSize": settings.DB_POOL_SIZE,
+        "minPoolSize": settings.DB_MIN_POOL_SIZE,
+        "connectTimeoutMS": settings.DB_CONNECT_TIMEOUT * 1000,
+        "serverSelectionTimeoutMS": settings.DB_CONNECT_TIMEOUT * 1000
+    }
+    for name, value in defaults.items():
+        options.setdefault(name, str(value))
+    return urlunsplit(parts._replace(query=urlencode(options)))
+
 class Database:
+    """The process's Prisma client.
+
+    The app lifespan (or worker entry point) connects once at startup and
+    disconnects at shutdown. ``get_client`` still connects on first use for
+    scripts, behind a lock so concurrent callers share one client.
+    """
+
     def __init__(self):
-        self._client = None
+        self._client: Optional[Prisma] = None
+        self._lock = asyncio.Lock()
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._connected_at: Optional[float] = None
 
     async def connect(self):
         """Initialize database connection."""
-        if not self._client:
-            self._client = Prisma()
-            await self._client.connect()
-            logger.info("Connected to database")
+        if self._client:
+            return self._client
+        async with self._lock:
+            if not self._client:
+                client = Prisma(
+                    datasource={"url": _datasource_url(settings.MONGODB_URL)},
+                    connect_timeout=timedelta(seconds=settings.DB_CONNECT_TIMEOUT),
+                    http={"timeout": settings.DB_QUERY_TIMEOUT}
+                )
+                await client.connect()
+                self._client = client
+                self._connected_at = time.time()
+                logger.info("Connected to database")
         return self._client
 
+    async def warm_up(self) -> None:
+        """Run a few concurrent reads so the first requests find open pool connections."""
+        client = await self.connect()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(
+                client.user.find_first() for _ in range(settings.DB_WARMUP_QUERIES)
+            ))
+            logger.info(f"Database warm-up took {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception as e:
+            # Startup continues; requests will surface a real outage
+            logger.error(f"Database warm-up failed: {str(e)}")
+
     async def disconnect(self):
-        """Disconnect from database."""
-        if self._client:
+        """Disconnect from database once in-flight operations finish."""
+        async with self._lock:
+            if not self._client:
+                return
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=settings.DB_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Disconnecting with {self._active} database operations still running")
             await self._client.disconnect()
             self._client = None
+            self._connected_at = None
             logger.info("Disconnected from database")
 
     @asynccontextmanager
     async def get_client(self):
         """Async context manager for database operations."""
-        if not self._client:
-            await self.connect()
+        client = self._client or await self.connect()
+        self._active += 1
+        self._idle.clear()
         try:
-            yield self._client
+            yield client
         except Exception as e:
             logger.error(f"Database error: {str(e)}")
             raise
+        finally:
+            self._active -= 1
+            if not self._active:
+                self._idle.set()
         # Connection stays open for reuse
 
-db = Database() 
\ No newline at end of file
+    def metrics(self) -> Dict:
+        return {
+            "connected": self._client is not None,
+            "active": self._active,
+            "uptime": round(time.time() - self._connected_at) if self._connected_at else 0
+        }
+
+db = Database()
@@ -0,0 +1,61 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class WorkerPool:
+    """Process pool for CPU-bound work that must not run on the event loop.
+
+    Submissions beyond ``max_pending`` wait on the event loop rather than piling
+    up inside the executor, so a burst cannot queue unbounded work.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_pending: int,
+        initializer: Optional[Callable[[], None]] = None
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._admission = asyncio.Semaphore(max_pending)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Started lazily so importing a service never forks processes
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=self.initializer
+            )
+            logger.info(f"Started {self.name} worker pool with {self.max_workers} processes")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a picklable top-level function in the pool and await its result."""
+        async with self._admission:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(func, *args, **kwargs)
+            )
+
+    def shutdown(self) -> None:
+        """Stop the pool after running tasks finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            logger.info(f"Stopped {self.name} worker pool")
+
+cpu_pool = WorkerPool(
+    "cpu",
+    max_workers=settings.CPU_WORKER_PROCESSES,
+    max_pending=settings.CPU_WORKER_MAX_PENDING
+)
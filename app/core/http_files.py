@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import uuid
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+MMAP_CHUNK_SIZE = 256 * 1024
+
+# Requests asking for more ranges than this get the whole file instead
+MAX_RANGES = 16
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# (path, mtime_ns, size) -> sha256, so each file is hashed once per process
+_digest_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_DIGEST_CACHE_SIZE = 4096
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def file_digest(path: str, stat: os.stat_result) -> str:
+    """SHA-256 of a file's content, cached by path, mtime and size."""
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _digest_cache.get(key)
+    if digest is None:
+        digest = await asyncio.to_thread(_hash_file, path)
+        _digest_cache[key] = digest
+        if len(_digest_cache) > _DIGEST_CACHE_SIZE:
+            _digest_cache.popitem(last=False)
+    else:
+        _digest_cache.move_to_end(key)
+    return digest
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a ``bytes=`` Range header into inclusive ``(start, end)`` pairs.
+
+    Returns None when the header should be ignored (the full file is served)
+    and an empty list when no requested range is satisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        start_text, sep, end_text = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start_text == "":
+                # Suffix range: the last N bytes
+                length = int(end_text)
+                if length == 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start_text)
+                end = int(end_text) if end_text else start
+                if end < start:
+                    return None
+                if start >= size:
+                    continue
+                end = min(end, size - 1) if end_text else size - 1
+        except ValueError:
+            return None
+        ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def _map_file(path: str) -> mmap.mmap:
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+async def _read_ranges(path: str, ranges: List[Tuple[int, int]], parts: Optional[List[bytes]] = None) -> AsyncIterator[bytes]:
+    """Yield the requested byte ranges, each preceded by its multipart header if given.
+
+    The file is memory-mapped, so chunks are sliced from the page cache
+    without a read call per chunk or an intermediate buffer.
+    """
+    if not ranges:
+        return
+    mapped = await asyncio.to_thread(_map_file, path)
+    try:
+        for index, (start, end) in enumerate(ranges):
+            if parts:
+                yield parts[index]
+            for offset in range(start, end + 1, MMAP_CHUNK_SIZE):
+                # Slicing may fault pages in from disk, so it stays off the event loop
+                yield await asyncio.to_thread(mapped.__getitem__, slice(offset, min(offset + MMAP_CHUNK_SIZE, end + 1)))
+        if parts:
+            yield parts[-1]
+    finally:
+        mapped.close()
+
+
+async def conditional_file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    filename: str,
+    etag_value: Optional[str] = None,
+    immutable: bool = False
+) -> Response:
+    """Serve a file with strong ETags, conditional GETs and byte-range support.
+
+    ``etag_value`` may be supplied when the caller already knows the content
+    hash (for content-addressed files); otherwise it is computed and cached.
+    """
+    stat = await asyncio.to_thread(os.stat, path)
+    size = stat.st_size
+    etag = f'"{etag_value or await file_digest(path, stat)}"'
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif _not_modified_since(request.headers.get("if-modified-since", ""), stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range only honours a strong ETag or the exact Last-Modified date
+    if range_header and (if_range is None or if_range in (etag, headers["Last-Modified"])):
+        ranges = parse_range(range_header, size)
+
+    is_head = request.method == "HEAD"
+    if ranges == []:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        if is_head:
+            return Response(status_code=200, headers=headers, media_type=media_type)
+        if range_header is None and "http.response.pathsend" in request.scope.get("extensions", {}):
+            # The server sends the file itself (sendfile), without copying it through Python
+            return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat)
+        return StreamingResponse(_read_ranges(path, [(0, size - 1)] if size else []), headers=headers, media_type=media_type)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        if is_head:
+            return Response(status_code=206, headers=headers, media_type=media_type)
+        return StreamingResponse(_read_ranges(path, ranges), status_code=206, headers=headers, media_type=media_type)
+
+    boundary = uuid.uuid4().hex
+    parts = [
+        (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    # Every part after the first is preceded by the CRLF ending the previous body
+    parts = [parts[0]] + [b"\r\n" + part for part in parts[1:]] + [f"\r\n--{boundary}--\r\n".encode()]
+    headers["Content-Length"] = str(
+        sum(len(part) for part in parts) + sum(end - start + 1 for start, end in ranges)
+    )
+    multipart_type = f"multipart/byteranges; boundary={boundary}"
+    if is_head:
+        return Response(status_code=206, headers=headers, media_type=multipart_type)
+    return StreamingResponse(
+        _read_ranges(path, ranges, parts),
+        status_code=206,
+        headers=headers,
+        media_type=multipart_type
+    )
@@ -1,9 +1,22 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 import logging
-from .api import auth, chat, files, pdf, content
+from .api import auth, chat, files, pdf, content, jobs
 from .core.config import settings
+from .core.database import db
+from .core.executor import cpu_pool
+from .core.security import password_pool
+from .services.auth_cache import auth_cache
+from .services.content_service import content_service
+from .services.job_service import job_service
+from .services.pdf_renderer import pdf_renderer
+from .services.rate_limiter import RateLimitMiddleware, rate_limiter
+from .services.revocation_service import revocation_service
+from .services.search_service import search_service
+from .services.storage_manager import storage_manager
+from .services import job_handlers  # noqa: F401  (registers job handlers)
 
 # Configure logging
 logging.basicConfig(
@@ -13,12 +26,44 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect the database, then start the auth cache, token revocation, PDF
+    render pool, content writer, search indexing, storage maintenance, and job
+    workers when the local job backend is configured. On shutdown, let running
+    work finish before disconnecting."""
+    await db.connect()
+    await db.warm_up()
+    auth_cache.start()
+    revocation_service.start()
+    await pdf_renderer.start()
+    await content_service.start()
+    search_service.start()
+    storage_manager.start()
+    job_service.start_local_workers()
+    yield
+    await job_service.stop_local_workers()
+    await storage_manager.stop()
+    await content_service.stop()
+    await search_service.stop()
+    await auth_cache.stop()
+    await revocation_service.stop()
+    cpu_pool.shutdown()
+    password_pool.shutdown()
+    pdf_renderer.shutdown()
+    # Last, so buffered content writes and index catch-ups can still reach it
+    await db.disconnect()
+
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    description="An AI-powered story generation application"
+    description="An AI-powered story generation application",
+    lifespan=lifespan
 )
 
+# Added before CORS so that 429 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +71,7 @@ app.add_middleware(
     allow_credentials=settings.CORS_CREDENTIALS,
     allow_methods=settings.CORS_METHODS,
     allow_headers=settings.CORS_HEADERS,
+    expose_headers=settings.CORS_EXPOSE_HEADERS,
 )
 
 # Include routers with /api prefix
@@ -34,6 +80,7 @@ app.include_router(chat.router, prefix=settings.API_PREFIX)
 app.include_router(files.router, prefix=settings.API_PREFIX)
 app.include_router(pdf.router, prefix=settings.API_PREFIX)
 app.include_router(content.router, prefix=settings.API_PREFIX)
+app.include_router(jobs.router, prefix=settings.API_PREFIX)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -49,4 +96,15 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "version": settings.APP_VERSION} 
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "version": settings.APP_VERSION,
+        "database": db.metrics(),
+        "auth_cache": auth_cache.metrics(),
+        "revocations": revocation_service.metrics(),
+        "rate_limit": rate_limiter.metrics(),
+        "pdf_render": pdf_renderer.metrics(),
+        "storage": await storage_manager.metrics(),
+        "content_writes": content_service.write_metrics(),
+        "content_cache": content_service.cache_metrics()
+    } 
\ No newline at end of file
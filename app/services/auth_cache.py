@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from ..core.config import settings
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+
+class AuthCache:
+    """Decoded access tokens and user profiles, cached in this process.
+
+    A token entry means the token was valid and not blacklisted when it was
+    cached; it lives for at most ``AUTH_CACHE_TTL`` seconds and never past
+    the token's own expiry. Logout, profile updates and deletions publish an
+    invalidation that every process applies. Entries are only served while
+    this process is subscribed, so a dropped connection cannot leave a
+    revoked token usable for longer than the TTL.
+    """
+
+    invalidation_channel = "auth:invalidate"
+
+    def __init__(self):
+        self.redis = cache_service.redis
+        self._tokens: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._users: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = False
+        self._stats = {"token_hits": 0, "user_hits": 0, "misses": 0}
+        logger.info("Auth Cache initialized")
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        # Raw tokens are not kept in memory or sent over pub/sub
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _get(self, entries: OrderedDict, key: str):
+        if not self._subscribed:
+            return None
+        entry = entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del entries[key]
+            self._stats["misses"] += 1
+            return None
+        entries.move_to_end(key)
+        return value
+
+    def _put(self, entries: OrderedDict, key: str, value, ttl: float) -> None:
+        if not self._subscribed or ttl <= 0:
+            return
+        entries[key] = (time.monotonic() + ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > settings.AUTH_CACHE_SIZE:
+            entries.popitem(last=False)
+
+    def get_token(self, token: str) -> Optional[str]:
+        """The user id of a cached, still-valid token."""
+        user_id = self._get(self._tokens, self._token_key(token))
+        if user_id is not None:
+            self._stats["token_hits"] += 1
+        return user_id
+
+    def put_token(self, token: str, user_id: str, expires_at: Optional[float]) -> None:
+        ttl = settings.AUTH_CACHE_TTL
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        self._put(self._tokens, self._token_key(token), user_id, ttl)
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        user = self._get(self._users, user_id)
+        if user is not None:
+            self._stats["user_hits"] += 1
+            return dict(user)
+        return None
+
+    def put_user(self, user_id: str, user: Dict) -> None:
+        self._put(self._users, user_id, dict(user), settings.AUTH_CACHE_TTL)
+
+    async def invalidate(self, tokens: Optional[List[str]] = None, user_ids: Optional[List[str]] = None) -> None:
+        """Drop tokens and users here and in every other process."""
+        message = {
+            "tokens": [self._token_key(token) for token in tokens or []],
+            "users": list(user_ids or [])
+        }
+        self._apply(message)
+        try:
+            await self.redis.publish(self.invalidation_channel, json.dumps(message))
+        except Exception as e:
+            # Other processes fall back on the TTL
+            logger.error(f"Failed to publish auth cache invalidation: {str(e)}")
+
+    def _apply(self, message: Dict) -> None:
+        for key in message.get("tokens", []):
+            self._tokens.pop(key, None)
+        for user_id in message.get("users", []):
+            self._users.pop(user_id, None)
+            # A deleted user's tokens must stop working too
+            for key in [key for key, (_, owner) in self._tokens.items() if owner == user_id]:
+                del self._tokens[key]
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.invalidation_channel)
+                self._subscribed = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Auth cache invalidation listener error: {str(e)}")
+                # Invalidations may have been missed while disconnected
+                self._subscribed = False
+                self._tokens.clear()
+                self._users.clear()
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """Follow invalidations; the cache stays empty until subscribed."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._subscribed = False
+        self._tokens.clear()
+        self._users.clear()
+
+    def metrics(self) -> Dict:
+        return {"tokens": len(self._tokens), "users": len(self._users), **self._stats}
+
+
+auth_cache = AuthCache()
@@ -1,10 +1,13 @@
 import logging
+import uuid
 from typing import Dict, Optional
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from ..core.config import settings
-from ..core.security import get_password_hash, verify_password
+from ..core.security import check_password, hash_password
 from ..core.database import db
+from .auth_cache import auth_cache
+from .refresh_token_service import refresh_token_service
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +41,7 @@ class AuthService:
                     raise ValueError("Email already registered")
 
                 # Hash password
-                hashed_password = get_password_hash(password)
+                hashed_password = await hash_password(password)
 
                 # Create user
                 user = await client.user.create(
@@ -69,14 +72,19 @@ class AuthService:
                     return None
 
                 # Verify password
-                if not verify_password(password, user.password):
+                valid, stale = await check_password(password, user.password)
+                if not valid:
                     return None
+                if stale:
+                    await self._rehash_password(client, user.id, password)
 
-                # Generate token
+                # Generate tokens
                 access_token = self.create_access_token(user.id)
+                refresh_token = await refresh_token_service.issue(user.id)
 
                 return {
                     "access_token": access_token,
+                    "refresh_token": refresh_token,
                     "token_type": "bearer",
                     "user": {
                         "id": user.id,
@@ -90,13 +98,39 @@ class AuthService:
             logger.error(f"Authentication failed: {str(e)}")
             raise
 
+    async def refresh_tokens(self, refresh_token: str) -> Dict:
+        """Exchange a refresh token for a new access token and the next refresh token.
+
+        Needs no password check or database read. Raises ValueError if the
+        refresh token is invalid, expired or already used.
+        """
+        user_id, next_token = await refresh_token_service.rotate(refresh_token)
+        return {
+            "access_token": self.create_access_token(user_id),
+            "refresh_token": next_token,
+            "token_type": "bearer"
+        }
+
+    async def _rehash_password(self, client, user_id: str, password: str) -> None:
+        """Store the password again at the current ``BCRYPT_ROUNDS``; login proceeds if this fails."""
+        try:
+            await client.user.update(
+                where={"id": user_id},
+                data={"password": await hash_password(password)}
+            )
+            logger.info(f"Rehashed password for user {user_id}")
+        except Exception as e:
+            logger.error(f"Failed to rehash password: {str(e)}")
+
     def create_access_token(self, user_id: str) -> str:
         """Create a JWT access token."""
         try:
             expiration = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
             data = {
                 "sub": str(user_id),
-                "exp": expiration
+                "exp": expiration,
+                # Names the token for revocation
+                "jti": uuid.uuid4().hex
             }
             return jwt.encode(
                 claims=data, 
@@ -128,7 +162,8 @@ class AuthService:
         try:
             async with db.get_client() as client:
                 await client.user.update(where={"id": user_id}, data={"apiKey": None})
-                return True
+            await auth_cache.invalidate(user_ids=[user_id])
+            return True
         except Exception as e:
             logger.error(f"Failed to logout user: {str(e)}")
             raise
@@ -160,7 +195,7 @@ class AuthService:
                 if "name" in data:
                     update_data["name"] = data["name"]
                 if "password" in data:
-                    update_data["password"] = get_password_hash(data["password"])
+                    update_data["password"] = await hash_password(data["password"])
                 if "apiKey" in data:
                     update_data["apiKey"] = data["apiKey"]
                 if "modelName" in data:
@@ -170,6 +205,10 @@ class AuthService:
                     where={"id": user_id},
                     data=update_data
                 )
+                await auth_cache.invalidate(user_ids=[user_id])
+                if "password" in update_data:
+                    # Sessions started with the old password must log in again
+                    await refresh_token_service.revoke_user(user_id)
 
                 return {
                     "id": user.id,
@@ -187,7 +226,9 @@ class AuthService:
         try:
             async with db.get_client() as client:
                 await client.user.delete(where={"id": user_id})
-                return True
+            await auth_cache.invalidate(user_ids=[user_id])
+            await refresh_token_service.revoke_user(user_id)
+            return True
 
         except Exception as e:
             logger.error(f"Failed to delete user: {str(e)}")
@@ -51,11 +51,12 @@ class CacheService:
         """Increment a counter and set TTL if not exists."""
         try:
             pipe = self.redis.pipeline()
-            await pipe.incr(key)
             if ttl is not None:
-                await pipe.expire(key, ttl)
+                # Only a new key gets the TTL, so the window is fixed from the first increment
+                pipe.set(key, 0, ex=ttl, nx=True)
+            pipe.incr(key)
             results = await pipe.execute()
-            return results[0]
+            return results[-1]
         except Exception as e:
             logger.error(f"Failed to increment counter: {str(e)}")
             return None
@@ -69,20 +70,4 @@ class CacheService:
             logger.error(f"Failed to get counter: {str(e)}")
             return None
 
-    def get_rate_limit_key(self, user_id: str) -> str:
-        """Generate a rate limit key for a user."""
-        return f"rate_limit:{user_id}"
-
-    async def check_rate_limit(self, user_id: str) -> bool:
-        """Check if a user has exceeded their rate limit."""
-        key = self.get_rate_limit_key(user_id)
-        try:
-            count = await self.increment(key, settings.RATE_LIMIT_WINDOW)
-            if count is None:
-                return False
-            return count <= settings.RATE_LIMIT_REQUESTS
-        except Exception as e:
-            logger.error(f"Failed to check rate limit: {str(e)}")
-            return False
-
 cache_service = CacheService() 
\ No newline at end of file
@@ -42,7 +42,7 @@ class ChatService:
             await self.cache.set(cache_key, response.text)
 
             # Save to database
-            await content_service.save_content(
+            await content_service.queue_content(
                 user_id=user_id,
                 content_type="CHAT",
                 title=text[:50] + "...",  # Use first 50 chars of query as title
@@ -140,7 +140,7 @@ class ChatService:
                 await self.cache.set(cache_key, response_data)
 
                 # Save to database
-                await content_service.save_content(
+                await content_service.queue_content(
                     user_id=user_id,
                     content_type="VOICE",
                     title=response_data["transcription"][:50] + "...",
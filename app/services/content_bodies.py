@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import zlib
+from typing import Dict, Optional
+from ..core.config import settings
+from .pdf_storage import LocalBlobBackend, S3BlobBackend
+
+try:
+    import zstandard
+except ImportError:  # zlib is used until zstandard is installed
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies that can leave the row: the row's content, and OCR/extracted text in metadata
+OFFLOADABLE_FIELDS = ("content", "original_content")
+
+
+class ContentBodyStore:
+    """Large content bodies, compressed and stored outside the database row.
+
+    A row whose content or ``metadata.original_content`` reaches
+    ``CONTENT_OFFLOAD_THRESHOLD`` characters keeps an empty placeholder and
+    a ``bodyRef`` naming the compressed blobs. Blob keys derive from the row
+    id, so retrying an offload overwrites rather than duplicates.
+    """
+
+    def __init__(self):
+        if settings.PDF_STORAGE_BACKEND == "s3":
+            self.backend = S3BlobBackend(prefix=settings.S3_BODY_PREFIX, content_type="application/octet-stream")
+        else:
+            self.backend = LocalBlobBackend(settings.CONTENT_BODY_PATH)
+        self.codec = "zstd" if zstandard is not None else "zlib"
+        logger.info(f"Content Body Store initialized ({self.codec})")
+
+    def _key(self, content_id: str, field: str) -> str:
+        # ObjectIds end in a counter and random bytes, which spread rows across shards
+        return f"{content_id[-2:]}/{content_id}.{field}.{self.codec}"
+
+    def _compress(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=settings.CONTENT_ZSTD_LEVEL).compress(data)
+        return zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(data: bytes, codec: str) -> str:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this content")
+            return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+        return zlib.decompress(data).decode("utf-8")
+
+    def _bodies(self, row: Dict) -> Dict[str, str]:
+        threshold = settings.CONTENT_OFFLOAD_THRESHOLD
+        bodies = {}
+        if len(row["content"]) >= threshold:
+            bodies["content"] = row["content"]
+        metadata = row.get("metadata")
+        if isinstance(metadata, dict) and len(metadata.get("original_content") or "") >= threshold:
+            bodies["original_content"] = metadata["original_content"]
+        return bodies
+
+    async def offload(self, row: Dict) -> Dict:
+        """Move a new row's large bodies to the store, returning the row to insert."""
+        if not settings.CONTENT_OFFLOAD_ENABLED or row.get("bodyRef"):
+            return row
+        bodies = self._bodies(row)
+        if not bodies:
+            return row
+
+        keys = {}
+        for field, text in bodies.items():
+            key = self._key(row["id"], field)
+            await self.backend.write(key, await asyncio.to_thread(self._compress, text))
+            keys[field] = key
+
+        row = dict(row)
+        if "content" in keys:
+            row["content"] = ""
+        if "original_content" in keys:
+            row["metadata"] = {name: value for name, value in row["metadata"].items() if name != "original_content"}
+        row["bodyRef"] = {"codec": self.codec, "fields": keys}
+        return row
+
+    async def load(self, body_ref: Optional[Dict]) -> Dict[str, str]:
+        """Read back the bodies a row refers to, by field name."""
+        if not body_ref:
+            return {}
+        codec = body_ref["codec"]
+
+        async def fetch(key: str) -> str:
+            return await asyncio.to_thread(self._decompress, await self.backend.read(key), codec)
+
+        fields = list(body_ref["fields"].items())
+        texts = await asyncio.gather(*(fetch(key) for _, key in fields))
+        return {field: text for (field, _), text in zip(fields, texts)}
+
+    async def delete(self, body_ref: Optional[Dict]) -> None:
+        """Remove the blobs of a deleted row."""
+        if not body_ref:
+            return
+        for key in body_ref["fields"].values():
+            try:
+                await self.backend.delete(key)
+            except Exception as e:
+                logger.error(f"Error deleting content body {key}: {str(e)}")
+
+
+content_bodies = ContentBodyStore()
@@ -1,16 +1,139 @@
+import asyncio
+import base64
 import logging
-from typing import Optional, Dict, List
-from datetime import datetime
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional, Dict, List, Set, Tuple
+from datetime import datetime, timezone
+from bson import ObjectId
+from prisma import Json
+from prisma.models import GeneratedContent
+from prisma.partials import GeneratedContentSummary
+from redis.exceptions import ResponseError
 from ..core.database import db
 from ..core.config import settings
+from .cache_service import cache_service
+from .content_bodies import content_bodies
+from .search_service import search_service
+from .storage_manager import storage_manager
+from .usage_service import usage_service
 import json
 
 logger = logging.getLogger(__name__)
 
+PREVIEW_CHARS = 200
+
+# Fields a history listing can add to the summary projection
+OPTIONAL_FIELDS = {"content", "metadata", "prompt"}
+
+# Scalar fields of a GeneratedContent row kept in the content cache
+CACHED_FIELDS = [
+    "id", "type", "title", "filename", "prompt", "content", "preview",
+    "fileUrl", "metadata", "bodyRef", "userId", "createdAt", "updatedAt"
+]
+
+OBJECT_ID_PATTERN = re.compile(r"[0-9a-f]{24}")
+
+def load_metadata(metadata) -> Dict:
+    """Row metadata as a dict; older rows stored it as a JSON string."""
+    if isinstance(metadata, str):
+        return json.loads(metadata)
+    return metadata or {}
+
+class ContentWriteUnavailable(Exception):
+    """Raised when content cannot be accepted because the write buffer stays full."""
+
 class ContentService:
+    """Generated content storage.
+
+    ``queue_content`` is write-behind: rows are journaled to a per-process
+    Redis hash, acknowledged, and written to MongoDB in ``create_many``
+    batches by size or time. Journals of processes that died with unwritten
+    rows are replayed by whichever live process next scans for them; rows
+    carry their id from the start, so a replay never inserts a row twice.
+    """
+
+    journal_prefix = "content:journal"
+    dead_letter_key = "content:dead"
+    cache_prefix = "content:row"
+    invalidation_channel = "content:invalidate"
+
     def __init__(self):
+        self.redis = cache_service.redis
+        self.node_id = uuid.uuid4().hex
+        self._buffer: List[Dict] = []
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._heartbeat_at = 0.0
+        self._recovered_at = 0.0
+        self._listener: Optional[asyncio.Task] = None
+        # content id -> (expiry, row or None for a cached miss)
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._cache_stats = {"local_hits": 0, "redis_hits": 0, "db_reads": 0}
+        self._stats = {
+            "queued": 0,
+            "written": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "dead_lettered": 0,
+            "backpressure_waits": 0,
+            "rejected": 0,
+            "recovered": 0
+        }
         logger.info("Content Service initialized")
 
+    @property
+    def _journal_key(self) -> str:
+        return f"{self.journal_prefix}:{self.node_id}"
+
+    def _content_data(
+        self,
+        user_id: str,
+        content_type: str,
+        title: str,
+        content: str,
+        prompt: Optional[str] = None,
+        filename: Optional[str] = None,
+        file_url: Optional[str] = None,
+        metadata: Optional[Dict] = None
+    ) -> Dict:
+        """Build the row data for a piece of generated content."""
+        return {
+            "userId": user_id,
+            "type": content_type,
+            "title": title,
+            "prompt": prompt,
+            "content": content,
+            "preview": " ".join(content[:PREVIEW_CHARS * 2].split())[:PREVIEW_CHARS],
+            "filename": filename,
+            "fileUrl": file_url,
+            "metadata": metadata or None
+        }
+
+    def _db_row(self, row: Dict) -> Dict:
+        """Row data as Prisma takes it: JSON columns wrapped, stored natively rather than as strings."""
+        data = dict(row)
+        for field in ("metadata", "bodyRef"):
+            if data.get(field) is not None:
+                data[field] = Json(data[field])
+        return data
+
+    async def hydrate(self, content):
+        """Put offloaded bodies back into a row read from the database."""
+        if content is None or not getattr(content, "bodyRef", None):
+            return content
+        bodies = await content_bodies.load(content.bodyRef)
+        row = {field: getattr(content, field) for field in CACHED_FIELDS}
+        if "content" in bodies:
+            row["content"] = bodies["content"]
+        if "original_content" in bodies:
+            row["metadata"] = {**load_metadata(row["metadata"]), "original_content": bodies["original_content"]}
+        return GeneratedContent(**row)
+
     async def save_content(
         self,
         user_id: str,
@@ -24,61 +147,440 @@ class ContentService:
     ):
         """Save generated content to the database."""
         try:
+            data = self._content_data(
+                user_id=user_id,
+                content_type=content_type,
+                title=title,
+                content=content,
+                prompt=prompt,
+                filename=filename,
+                file_url=file_url,
+                metadata=metadata
+            )
+            data["id"] = str(ObjectId())
+            stored = await content_bodies.offload(data)
             async with db.get_client() as client:
-                content = await client.generatedcontent.create(
-                    data={
-                        "userId": user_id,
-                        "type": content_type,
-                        "title": title,
-                        "prompt": prompt,
-                        "content": content,
-                        "filename": filename,
-                        "fileUrl": file_url,
-                        "metadata": json.dumps(metadata) if metadata else None
-                    }
-                )
-                return content
+                row = await client.generatedcontent.create(data=self._db_row(stored))
+            await usage_service.record(data)
+            await search_service.index([(user_id, row.id)])
+            return row
         except Exception as e:
             logger.error(f"Error saving content: {str(e)}")
             raise
 
+    async def queue_content(
+        self,
+        user_id: str,
+        content_type: str,
+        title: str,
+        content: str,
+        prompt: Optional[str] = None,
+        filename: Optional[str] = None,
+        file_url: Optional[str] = None,
+        metadata: Optional[Dict] = None
+    ) -> str:
+        """Record generated content without waiting for the database. Returns its id.
+
+        Waits only when the write buffer is full, until a flush makes room.
+        """
+        row = self._content_data(
+            user_id=user_id,
+            content_type=content_type,
+            title=title,
+            content=content,
+            prompt=prompt,
+            filename=filename,
+            file_url=file_url,
+            metadata=metadata
+        )
+        row["id"] = str(ObjectId())
+        row["createdAt"] = datetime.now(timezone.utc)
+
+        if not settings.CONTENT_WRITE_BEHIND:
+            await self._write_rows([row])
+            await usage_service.record(row)
+            await search_service.index([(user_id, row["id"])])
+            return row["id"]
+
+        await self._ensure_flusher()
+        # Bounded, so a database outage fails requests instead of hanging them
+        deadline = time.monotonic() + settings.CONTENT_BACKPRESSURE_TIMEOUT
+        while len(self._buffer) >= settings.CONTENT_BUFFER_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._stats["rejected"] += 1
+                raise ContentWriteUnavailable("Content storage is temporarily unavailable, please try again later")
+            self._stats["backpressure_waits"] += 1
+            logger.warning(f"Content write buffer full ({len(self._buffer)} rows), waiting for a flush")
+            self._drained.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._drained.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        await self.redis.hset(self._journal_key, row["id"], self._encode(row))
+        self._buffer.append(row)
+        self._stats["queued"] += 1
+        # Counted only once accepted, so rejected writes cost the user nothing
+        await usage_service.record(row)
+        if len(self._buffer) >= settings.CONTENT_FLUSH_BATCH:
+            self._wakeup.set()
+        return row["id"]
+
+    def _encode(self, row: Dict) -> str:
+        return json.dumps({**row, "createdAt": row["createdAt"].isoformat()})
+
+    def _plain_row(self, row: Dict) -> Dict:
+        return {field: value.data if isinstance(value, Json) else value for field, value in row.items()}
+
+    def _decode(self, entry: str) -> Dict:
+        row = json.loads(entry)
+        row["createdAt"] = datetime.fromisoformat(row["createdAt"])
+        return row
+
+    async def _write_rows(self, rows: List[Dict]) -> None:
+        """Insert rows that are not already in the database.
+
+        A failed bulk write is retried row by row; rows that still fail are
+        moved to a dead-letter hash so one bad row cannot wedge the buffer.
+        Raises if the database itself is unreachable, leaving rows queued.
+        Large bodies are moved to the body store first.
+        """
+        rows = [self._db_row(row) for row in await asyncio.gather(*(content_bodies.offload(row) for row in rows))]
+        async with db.get_client() as client:
+            try:
+                await client.generatedcontent.create_many(data=rows)
+                return
+            except Exception as e:
+                logger.warning(f"Bulk content write failed, retrying row by row: {str(e)}")
+
+            existing = await client.generatedcontent.find_many(
+                where={"id": {"in": [row["id"] for row in rows]}}
+            )
+            existing_ids = {content.id for content in existing}
+            for row in rows:
+                if row["id"] in existing_ids:
+                    continue
+                try:
+                    await client.generatedcontent.create(data=row)
+                except Exception as e:
+                    logger.error(f"Dead-lettering content row {row['id']}: {str(e)}")
+                    await self.redis.hset(self.dead_letter_key, row["id"], self._encode(self._plain_row(row)))
+                    self._stats["dead_lettered"] += 1
+
+    async def flush(self) -> None:
+        """Write every buffered row, one batch at a time."""
+        while self._buffer:
+            batch = self._buffer[:settings.CONTENT_FLUSH_BATCH]
+            try:
+                await self._write_rows(batch)
+            except Exception as e:
+                # Rows stay buffered and journaled for the next attempt
+                self._stats["failed_batches"] += 1
+                logger.error(f"Error flushing content batch: {str(e)}")
+                return
+            del self._buffer[:len(batch)]
+            written_ids = [row["id"] for row in batch]
+            await self.redis.hdel(self._journal_key, *written_ids)
+            # A read that raced the write may have cached a miss
+            await self.invalidate(written_ids)
+            # Indexed only now, so processes that read the row back find it
+            await search_service.index((row["userId"], row["id"]) for row in batch)
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._drained.set()
+
+    async def _heartbeat(self) -> None:
+        """Mark this process's journal as owned, so no other process replays it."""
+        now = time.monotonic()
+        if now - self._heartbeat_at >= settings.CONTENT_JOURNAL_TTL / 3:
+            await self.redis.set(f"{self._journal_key}:alive", 1, ex=settings.CONTENT_JOURNAL_TTL)
+            self._heartbeat_at = now
+
+    async def _run_flusher(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.CONTENT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._heartbeat()
+                await self.flush()
+                # Journals become replayable only once their owner's heartbeat lapses
+                if time.monotonic() - self._recovered_at >= settings.CONTENT_RECOVER_INTERVAL:
+                    self._recovered_at = time.monotonic()
+                    await self.recover()
+            except Exception as e:
+                logger.error(f"Content flusher error: {str(e)}")
+
+    async def _ensure_flusher(self) -> None:
+        if self._flusher is None:
+            await self._heartbeat()
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def pending_filenames(self) -> Set[str]:
+        """File names of rows accepted but not yet written, by any process.
+
+        Covers this process's buffer and every journal, including ones being
+        replayed, so storage GC does not mistake their files for orphans.
+        """
+        filenames = {row["filename"] for row in self._buffer if row.get("filename")}
+        async for key in self.redis.scan_iter(match=f"{self.journal_prefix}:*"):
+            if key.endswith(":alive"):
+                continue
+            for entry in await self.redis.hvals(key):
+                filename = json.loads(entry).get("filename")
+                if filename:
+                    filenames.add(filename)
+        return filenames
+
+    async def recover(self) -> int:
+        """Replay journals left by processes that stopped without flushing. Returns rows replayed.
+
+        A journal whose replay fails is left claimed but unowned, so a later
+        scan retries it.
+        """
+        recovered = 0
+        async for key in self.redis.scan_iter(match=f"{self.journal_prefix}:*"):
+            if key.endswith(":alive") or key == self._journal_key:
+                continue
+            if await self.redis.exists(f"{key}:alive"):
+                continue
+            # Renaming claims the journal; if another process got there first it is gone
+            claimed = f"{self.journal_prefix}:{uuid.uuid4().hex}.replay"
+            try:
+                await self.redis.rename(key, claimed)
+            except ResponseError:
+                continue
+            # Owned while it is replayed, so other processes' scans leave it alone
+            await self.redis.set(f"{claimed}:alive", 1, ex=settings.CONTENT_JOURNAL_TTL)
+            try:
+                rows = [self._decode(entry) for entry in (await self.redis.hgetall(claimed)).values()]
+                for start in range(0, len(rows), settings.CONTENT_FLUSH_BATCH):
+                    batch = rows[start:start + settings.CONTENT_FLUSH_BATCH]
+                    await self._write_rows(batch)
+                    await search_service.index((row["userId"], row["id"]) for row in batch)
+                await self.redis.delete(claimed)
+            except Exception as e:
+                logger.error(f"Error replaying content journal {key}: {str(e)}")
+                continue
+            finally:
+                await self.redis.delete(f"{claimed}:alive")
+            recovered += len(rows)
+        if recovered:
+            self._stats["recovered"] += recovered
+            logger.info(f"Replayed {recovered} journaled content rows")
+        return recovered
+
+    async def start(self) -> None:
+        """Follow cache invalidations, replay orphaned journals and start the write-behind flusher."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen_invalidations())
+        if settings.CONTENT_WRITE_BEHIND:
+            await self._ensure_flusher()
+
+    async def stop(self) -> None:
+        """Stop the flusher after writing everything still buffered."""
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        if not self._buffer:
+            await self.redis.delete(f"{self._journal_key}:alive")
+
+    def write_metrics(self) -> Dict:
+        """Write-behind buffer depth and counters for this process."""
+        return {"buffered": len(self._buffer), **self._stats}
+
+    def cache_metrics(self) -> Dict:
+        """Content-by-id cache hit counters for this process."""
+        return {"cached": len(self._local), **self._cache_stats}
+
+    def encode_cursor(self, content) -> str:
+        """An opaque cursor pointing just past ``content`` in newest-first order."""
+        key = json.dumps({"t": content.createdAt.isoformat(), "i": content.id})
+        return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: str) -> Tuple[datetime, str]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(key["t"]), str(key["i"])
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid cursor")
+
     async def get_user_content(
         self,
         user_id: str,
         content_type: Optional[str] = None,
         limit: int = 50,
-        offset: int = 0
-    ) -> List[Dict]:
-        """Get user's generated content with optional filtering by type."""
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        include: Optional[Set[str]] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Get user's generated content with optional filtering by type.
+
+        Pages are keyed on ``(createdAt, id)``: pass the returned cursor to get
+        the next page, which costs the same however deep it is. ``offset`` is
+        kept for older clients. Rows carry only summary fields unless
+        ``include`` asks for any of OPTIONAL_FIELDS. Returns the page and the
+        next cursor, if any.
+        """
         try:
+            include = include or set()
+            unknown = include - OPTIONAL_FIELDS
+            if unknown:
+                raise ValueError(f"Unknown include fields: {', '.join(sorted(unknown))}")
+
             async with db.get_client() as client:
+                # The partial model selects only its own fields
+                actions = client.generatedcontent if include else GeneratedContentSummary.prisma(client)
                 where = {"userId": user_id}
                 if content_type:
                     where["type"] = content_type
+                if cursor:
+                    created_at, content_id = self.decode_cursor(cursor)
+                    where["OR"] = [
+                        {"createdAt": {"lt": created_at}},
+                        {"createdAt": created_at, "id": {"lt": content_id}}
+                    ]
 
-                contents = await client.generatedcontent.find_many(
+                # One extra row tells us whether there is a next page
+                contents = await actions.find_many(
                     where=where,
-                    order={"createdAt": "desc"},
-                    skip=offset,
-                    take=limit
+                    order=[{"createdAt": "desc"}, {"id": "desc"}],
+                    skip=None if cursor else offset,
+                    take=limit + 1
                 )
-                return contents
+                next_cursor = None
+                if len(contents) > limit:
+                    contents = contents[:limit]
+                    next_cursor = self.encode_cursor(contents[-1])
+            if include & {"content", "metadata"}:
+                contents = await asyncio.gather(*(self.hydrate(content) for content in contents))
+            return list(contents), next_cursor
         except Exception as e:
             logger.error(f"Error fetching content: {str(e)}")
             raise
 
-    async def get_content_by_id(self, content_id: str) -> Optional[Dict]:
-        """Get specific content by ID."""
+    async def get_user_content_by_ids(self, user_id: str, content_ids: List[str]) -> List[Dict]:
+        """Summaries of a user's content, in the order of ``content_ids``. Missing ids are skipped."""
+        if not content_ids:
+            return []
         try:
             async with db.get_client() as client:
-                content = await client.generatedcontent.find_unique(
-                    where={"id": content_id}
+                rows = await GeneratedContentSummary.prisma(client).find_many(
+                    where={"id": {"in": content_ids}, "userId": user_id}
                 )
-                return content
+            by_id = {row.id: row for row in rows}
+            return [by_id[content_id] for content_id in content_ids if content_id in by_id]
         except Exception as e:
             logger.error(f"Error fetching content: {str(e)}")
             raise
 
+    def _cache_key(self, content_id: str) -> str:
+        return f"{self.cache_prefix}:{content_id}"
+
+    def _local_get(self, content_id: str):
+        entry = self._local.get(content_id)
+        if entry is None:
+            return None
+        expires, content = entry
+        if expires < time.monotonic():
+            del self._local[content_id]
+            return None
+        self._local.move_to_end(content_id)
+        return entry
+
+    def _local_put(self, content_id: str, content) -> None:
+        ttl = settings.CONTENT_CACHE_LOCAL_TTL if content is not None else settings.CONTENT_CACHE_NEGATIVE_TTL
+        self._local[content_id] = (time.monotonic() + ttl, content)
+        self._local.move_to_end(content_id)
+        while len(self._local) > settings.CONTENT_CACHE_LOCAL_SIZE:
+            self._local.popitem(last=False)
+
+    def _serialize(self, content) -> str:
+        row = {field: getattr(content, field) for field in CACHED_FIELDS}
+        return json.dumps(row, separators=(",", ":"), default=lambda value: value.isoformat())
+
+    async def _load_content(self, content_id: str):
+        """Read a row through Redis, caching misses briefly as well as hits."""
+        cached = await self.redis.get(self._cache_key(content_id))
+        if cached is not None:
+            self._cache_stats["redis_hits"] += 1
+            return GeneratedContent(**json.loads(cached)) if cached else None
+
+        self._cache_stats["db_reads"] += 1
+        async with db.get_client() as client:
+            content = await client.generatedcontent.find_unique(
+                where={"id": content_id}
+            )
+        if content is None:
+            await self.redis.set(self._cache_key(content_id), "", ex=settings.CONTENT_CACHE_NEGATIVE_TTL)
+        else:
+            await self.redis.set(self._cache_key(content_id), self._serialize(content), ex=settings.CONTENT_CACHE_TTL)
+        return content
+
+    async def get_content_by_id(self, content_id: str) -> Optional[Dict]:
+        """Get specific content by ID.
+
+        Reads go through an in-process LRU, then Redis, then MongoDB.
+        Concurrent misses for the same id share one read.
+        """
+        try:
+            if not OBJECT_ID_PATTERN.fullmatch(content_id):
+                return None
+            entry = self._local_get(content_id)
+            if entry is not None:
+                self._cache_stats["local_hits"] += 1
+                return await self.hydrate(entry[1])
+
+            loading = self._loading.get(content_id)
+            if loading is None:
+                loading = self._loading[content_id] = asyncio.ensure_future(self._load_content(content_id))
+                loading.add_done_callback(lambda _: self._loading.pop(content_id, None))
+            content = await asyncio.shield(loading)
+            self._local_put(content_id, content)
+            # Offloaded bodies are read per request rather than held in the caches
+            return await self.hydrate(content)
+        except Exception as e:
+            logger.error(f"Error fetching content: {str(e)}")
+            raise
+
+    async def invalidate(self, content_ids: List[str]) -> None:
+        """Drop cached rows, including cached misses, in Redis and in every process."""
+        if not content_ids:
+            return
+        await self.redis.delete(*[self._cache_key(content_id) for content_id in content_ids])
+        await self.redis.publish(self.invalidation_channel, json.dumps(content_ids))
+
+    async def _listen_invalidations(self) -> None:
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.invalidation_channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        for content_id in json.loads(message["data"]):
+                            self._local.pop(content_id, None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Content cache invalidation listener error: {str(e)}")
+                # Updates may have been missed while disconnected
+                self._local.clear()
+                await asyncio.sleep(1)
+
     async def delete_content(self, content_id: str, user_id: str) -> bool:
         """Delete specific content."""
         try:
@@ -89,7 +591,14 @@ class ContentService:
                         "userId": user_id
                     }
                 )
-                return bool(content)
+            if not content:
+                return False
+            await self.invalidate([content_id])
+            await search_service.remove(user_id, content_id)
+            await content_bodies.delete(content.bodyRef)
+            if content.type == "PDF" and content.filename:
+                await storage_manager.release(user_id, content.filename)
+            return True
         except Exception as e:
             logger.error(f"Error deleting content: {str(e)}")
             raise
@@ -0,0 +1,324 @@
+import codecs
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import magic
+import pytesseract
+from PIL import Image
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+from ..core.config import settings
+from .summary_service import PAGE_BREAK
+
+logger = logging.getLogger(__name__)
+
+# Bytes read at a time by the streaming extractors
+READ_CHUNK_SIZE = 64 * 1024
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class Extractor:
+    """Handler for one family of file formats, selected by sniffed MIME type."""
+
+    name = "file"
+    mime_types: Tuple[str, ...] = ()
+    # Canonical extension used when the file is uploaded upstream
+    extension = ""
+    # Whether Gemini accepts the file as an upload
+    gemini_upload = False
+    # Whether text can be extracted locally
+    extracts_text = False
+
+    def extract(self, file: BinaryIO) -> str:
+        """Extract text from the file."""
+        raise ValueError(f"Text extraction is not supported for {self.name} files")
+
+
+class _TextBuffer:
+    """Collects extracted text up to EXTRACT_MAX_CHARS, dropping the rest."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.length = 0
+        self.truncated = False
+
+    def append(self, text: str) -> bool:
+        """Add text; returns False once the limit has been reached."""
+        remaining = settings.EXTRACT_MAX_CHARS - self.length
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self.parts.append(text)
+        self.length += len(text)
+        return not self.truncated
+
+    def getvalue(self, separator: str = "") -> str:
+        if self.truncated:
+            logger.warning(f"Extracted text truncated at {settings.EXTRACT_MAX_CHARS} characters")
+        return separator.join(self.parts)
+
+
+class ImageExtractor(Extractor):
+    name = "image"
+    gemini_upload = True
+    extracts_text = True
+
+    def __init__(self, mime_type: str, extension: str):
+        self.mime_types = (mime_type,)
+        self.extension = extension
+
+    def extract(self, file: BinaryIO) -> str:
+        """Extract text from image using Pytesseract."""
+        try:
+            logger.info("Starting OCR process")
+            file.seek(0)
+            with Image.open(file) as image:
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                text = pytesseract.image_to_string(image)
+
+            if not text.strip():
+                logger.warning("No text extracted from image")
+                return "No text could be extracted from the image."
+
+            logger.info(f"Successfully extracted text from image: {text[:100]}...")
+            return text
+        except Exception as e:
+            logger.error(f"Error in OCR process: {str(e)}")
+            raise ValueError(f"Failed to process image: {str(e)}")
+
+
+class HeifExtractor(Extractor):
+    name = "HEIF image"
+    mime_types = ("image/heic", "image/heif")
+    extension = ".heic"
+    gemini_upload = True
+
+
+class PdfExtractor(Extractor):
+    name = "PDF"
+    mime_types = ("application/pdf",)
+    extension = ".pdf"
+    gemini_upload = True
+    extracts_text = True
+
+    def extract(self, file: BinaryIO) -> str:
+        """Extract text from PDF using OCR, rasterizing one page at a time."""
+        try:
+            logger.info("Starting PDF processing")
+            file.seek(0)
+            pdf_data = file.read()
+            page_count = pdfinfo_from_bytes(pdf_data)["Pages"]
+
+            extracted = _TextBuffer()
+            for page in range(1, page_count + 1):
+                logger.info(f"Processing page {page}/{page_count}")
+                images = convert_from_bytes(
+                    pdf_data,
+                    dpi=300,  # Higher DPI for better quality
+                    fmt='PNG',
+                    first_page=page,
+                    last_page=page
+                )
+                for image in images:
+                    if image.mode != 'RGB':
+                        image = image.convert('RGB')
+                    text = pytesseract.image_to_string(image)
+                    image.close()
+                    if text.strip() and not extracted.append(text):
+                        break
+                if extracted.truncated:
+                    break
+
+            if not extracted.parts:
+                logger.warning("No text extracted from PDF")
+                return "No text could be extracted from the PDF."
+
+            # Keep page boundaries for chunking
+            full_text = extracted.getvalue(PAGE_BREAK)
+            logger.info(f"Successfully extracted text from PDF: {len(full_text)} characters")
+            return full_text
+        except Exception as e:
+            error_msg = f"Failed to process PDF: {str(e)}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+
+class TextExtractor(Extractor):
+    name = "text"
+    mime_types = ("text/plain", "text/markdown", "text/x-markdown", "text/csv")
+    extension = ".txt"
+    gemini_upload = True
+    extracts_text = True
+
+    def __init__(self, mime_types: Optional[Tuple[str, ...]] = None, extension: str = ".txt"):
+        if mime_types:
+            self.mime_types = mime_types
+        self.extension = extension
+
+    def extract(self, file: BinaryIO) -> str:
+        """Decode a text file incrementally in its detected encoding."""
+        try:
+            logger.info("Reading text file content")
+            file.seek(0)
+            head = file.read(READ_CHUNK_SIZE)
+            encoding = _detect_encoding(head)
+            decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+
+            extracted = _TextBuffer()
+            chunk = head
+            while extracted.append(decoder.decode(chunk, final=not chunk)) and chunk:
+                chunk = file.read(READ_CHUNK_SIZE)
+
+            content = extracted.getvalue()
+            if not content.strip():
+                raise ValueError("The file is empty")
+
+            logger.info(f"Successfully read text file: {content[:100]}...")
+            return content
+        except UnicodeDecodeError as e:
+            logger.error(f"Unicode decode error: {str(e)}")
+            raise ValueError("File encoding not supported. Please ensure the file is in UTF-8 format.")
+        except ValueError:
+            raise
+        except Exception as e:
+            error_msg = f"Failed to read text file: {str(e)}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+
+class DocxExtractor(Extractor):
+    name = "Word document"
+    mime_types = (DOCX_MIME_TYPE,)
+    extension = ".docx"
+    extracts_text = True
+
+    _W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+    def extract(self, file: BinaryIO) -> str:
+        """Stream paragraphs out of word/document.xml without building the whole tree."""
+        try:
+            logger.info("Reading Word document")
+            file.seek(0)
+            extracted = _TextBuffer()
+            paragraph: List[str] = []
+            with zipfile.ZipFile(file) as archive, archive.open("word/document.xml") as document:
+                for _, element in ET.iterparse(document, events=("end",)):
+                    tag = element.tag
+                    if tag == f"{self._W}t":
+                        paragraph.append(element.text or "")
+                    elif tag == f"{self._W}tab":
+                        paragraph.append("\t")
+                    elif tag == f"{self._W}br":
+                        is_page = element.get(f"{self._W}type") == "page"
+                        paragraph.append(PAGE_BREAK if is_page else "\n")
+                    elif tag == f"{self._W}p":
+                        # Blank line between paragraphs, as the chunker expects
+                        if not extracted.append("".join(paragraph) + "\n\n"):
+                            break
+                        paragraph = []
+                        element.clear()
+
+            content = extracted.getvalue().strip()
+            if not content:
+                raise ValueError("The file is empty")
+            logger.info(f"Successfully read Word document: {content[:100]}...")
+            return content
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            logger.error(f"Invalid Word document: {str(e)}")
+            raise ValueError("The file is not a valid Word document")
+
+
+class MediaExtractor(Extractor):
+    """Audio and video, which Gemini accepts directly but we cannot extract locally."""
+
+    def __init__(self, name: str, mime_types: Tuple[str, ...], extension: str):
+        self.name = name
+        self.mime_types = mime_types
+        self.extension = extension
+        self.gemini_upload = True
+
+
+def _detect_encoding(head: bytes) -> str:
+    """Detect a text encoding from the leading bytes of a file."""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    detected = magic.Magic(mime_encoding=True).from_buffer(head)
+    if detected in ("us-ascii", "binary", "unknown-8bit"):
+        return "utf-8"
+    try:
+        return codecs.lookup(detected).name
+    except LookupError:
+        return "utf-8"
+
+
+class ExtractorRegistry:
+    """Maps sniffed MIME types to extractors."""
+
+    SNIFF_BYTES = 8192
+
+    def __init__(self):
+        self._extractors: Dict[str, Extractor] = {}
+
+    def register(self, extractor: Extractor) -> Extractor:
+        for mime_type in extractor.mime_types:
+            self._extractors[mime_type] = extractor
+        return extractor
+
+    def sniff(self, file: BinaryIO) -> str:
+        """Detect the MIME type of a file from its content."""
+        file.seek(0)
+        head = file.read(self.SNIFF_BYTES)
+        file.seek(0)
+        if not head:
+            raise ValueError("The file is empty")
+
+        mime_type = magic.from_buffer(head, mime=True)
+        if mime_type in ("application/zip", "application/octet-stream") and head.startswith(b"PK"):
+            # Older libmagic builds report Office Open XML files as plain zip archives
+            try:
+                with zipfile.ZipFile(file) as archive:
+                    if "word/document.xml" in archive.namelist():
+                        mime_type = DOCX_MIME_TYPE
+            except zipfile.BadZipFile:
+                pass
+            finally:
+                file.seek(0)
+        return mime_type
+
+    def resolve(self, file: BinaryIO, filename: str, require_text: bool = False) -> Extractor:
+        """Pick the extractor for a file, rejecting unsupported content up front."""
+        mime_type = self.sniff(file)
+        extractor = self._extractors.get(mime_type)
+        if extractor is None and mime_type.startswith("text/"):
+            extractor = self._extractors["text/plain"]
+        if extractor is None or (require_text and not extractor.extracts_text):
+            error_msg = f"Unsupported file type: {filename} ({mime_type})"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        logger.info(f"Detected {filename} as {mime_type}, using {extractor.name} extractor")
+        return extractor
+
+
+extractor_registry = ExtractorRegistry()
+extractor_registry.register(ImageExtractor("image/jpeg", ".jpg"))
+extractor_registry.register(ImageExtractor("image/png", ".png"))
+extractor_registry.register(ImageExtractor("image/webp", ".webp"))
+extractor_registry.register(ImageExtractor("image/bmp", ".bmp"))
+extractor_registry.register(ImageExtractor("image/x-ms-bmp", ".bmp"))
+extractor_registry.register(HeifExtractor())
+extractor_registry.register(PdfExtractor())
+extractor_registry.register(TextExtractor())
+extractor_registry.register(TextExtractor(("text/html",), ".html"))
+extractor_registry.register(TextExtractor(("text/css",), ".css"))
+extractor_registry.register(DocxExtractor())
+extractor_registry.register(MediaExtractor("audio", ("audio/mpeg",), ".mp3"))
+extractor_registry.register(MediaExtractor("audio", ("audio/wav", "audio/x-wav", "audio/vnd.wave"), ".wav"))
+extractor_registry.register(MediaExtractor("audio", ("audio/aac", "audio/x-hx-aac-adts"), ".aac"))
+extractor_registry.register(MediaExtractor("audio", ("audio/ogg",), ".ogg"))
+extractor_registry.register(MediaExtractor("audio", ("audio/flac", "audio/x-flac"), ".flac"))
+extractor_registry.register(MediaExtractor("video", ("video/mp4",), ".mp4"))
+extractor_registry.register(MediaExtractor("video", ("video/mpeg",), ".mpeg"))
+extractor_registry.register(MediaExtractor("video", ("video/3gpp",), ".3gpp"))
+extractor_registry.register(MediaExtractor("video", ("video/webm",), ".webm"))
@@ -1,16 +1,17 @@
+import asyncio
 import logging
-from typing import Dict, Optional, Any, BinaryIO, List
+from typing import Dict, Optional, Any, AsyncIterator, BinaryIO, List, Tuple
 import google.generativeai as genai
-from PIL import Image
-import numpy as np
-import pytesseract
-from PyPDF2 import PdfReader
-from pdf2image import convert_from_bytes
 from app.core.config import settings
+from app.core.executor import cpu_pool
 from app.services.cache_service import cache_service
-from app.services.content_service import content_service
+from app.services.content_service import ContentWriteUnavailable, content_service
+from app.services.extractors import extractor_registry
+from app.services.media_service import media_service
+from app.services.summary_service import summary_service, estimate_tokens, PAGE_BREAK, ANALYSIS_INSTRUCTIONS
 import io
 import os
+import tempfile
 
 
 
@@ -22,153 +23,36 @@ class FileService:
         self.cache = cache_service
         logger.info("FileService initialized")
 
-    def _process_pdf(self, file: BinaryIO) -> str:
-        """Extract text from PDF using OCR on each page."""
-        try:
-            logger.info("Starting PDF processing")
-            
-            # Ensure we're at the start of the file
-            file.seek(0)
-            
-            # Read PDF file
-            pdf_data = file.read()
-            
-            try:
-                # Convert PDF pages to images
-                images = convert_from_bytes(
-                    pdf_data,
-                    dpi=300,  # Higher DPI for better quality
-                    fmt='PNG'
-                )
-                
-                # Process each page with OCR
-                extracted_texts = []
-                for i, image in enumerate(images, 1):
-                    logger.info(f"Processing page {i}/{len(images)}")
-                    
-                    # Convert to RGB if necessary
-                    if image.mode != 'RGB':
-                        image = image.convert('RGB')
-                    
-                    # Perform OCR
-                    text = pytesseract.image_to_string(image)
-                    if text.strip():
-                        extracted_texts.append(text)
-                    
-                    # Clean up memory
-                    image.close()
-                
-                if not extracted_texts:
-                    logger.warning("No text extracted from PDF")
-                    return "No text could be extracted from the PDF."
-                
-                # Combine all extracted text
-                full_text = "\n\n".join(extracted_texts)
-                logger.info(f"Successfully extracted text from PDF: {len(full_text)} characters")
-                return full_text
-                
-            except Exception as pdf_error:
-                logger.error(f"Error processing PDF: {str(pdf_error)}")
-                raise ValueError(f"Failed to process PDF: {str(pdf_error)}")
-                
-        except Exception as e:
-            error_msg = f"Failed to process PDF: {str(e)}"
-            logger.error(error_msg)
-            raise ValueError(error_msg)
+    def _resolve_model(self, model_name: Optional[str]) -> str:
+        model_name = model_name or settings.DEFAULT_MODEL
+        if model_name not in settings.AVAILABLE_MODELS:
+            model_name = settings.DEFAULT_MODEL
+        return model_name
 
-    def _process_image(self, file: BinaryIO) -> str:
-        """Extract text from image using Pytesseract."""
-        try:
-            logger.info("Starting OCR process")
-            
-            # Ensure we're at the start of the file
-            file.seek(0)
-            
-            # Read image data
-            image_data = file.read()
-            
-            try:
-                # Create BytesIO object and write image data
-                image_io = io.BytesIO(image_data)
-                image_io.seek(0)  # Reset position to start
-                
-                # Open with PIL
-                image = Image.open(image_io)
-                
-                # Convert to RGB if necessary
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Perform OCR using pytesseract
-                text = pytesseract.image_to_string(image)
-                
-                if not text.strip():
-                    logger.warning("No text extracted from image")
-                    return "No text could be extracted from the image."
-                
-                logger.info(f"Successfully extracted text from image: {text[:100]}...")
-                return text
-                
-            except Exception as img_error:
-                logger.error(f"Error processing image data: {str(img_error)}")
-                raise ValueError(f"Failed to process image data: {str(img_error)}")
-                
-        except Exception as e:
-            error_msg = f"Failed to process image: {str(e)}"
-            logger.error(f"Error in OCR process: {str(e)}")
-            raise ValueError(error_msg)
+    async def _generate_ai_response(self, content: str, model_name: Optional[str] = None) -> str:
+        """Generate AI response for the file content.
 
-    def _process_text_file(self, file: BinaryIO) -> str:
-        """Extract text from text-based files."""
+        Documents larger than one chunk budget are summarized map-reduce style.
+        """
         try:
-            logger.info("Reading text file content")
-            # Ensure we're at the start of the file
-            file.seek(0)
-            content = file.read().decode('utf-8')
-            
-            if not content.strip():
-                error_msg = "The file is empty"
-                logger.warning(error_msg)
-                raise ValueError(error_msg)
-            
-            logger.info(f"Successfully read text file: {content[:100]}...")
-            return content
+            logger.info("Generating AI response for content")
+            model_name = self._resolve_model(model_name)
 
-        except UnicodeDecodeError as e:
-            error_msg = "File encoding not supported. Please ensure the file is in UTF-8 format."
-            logger.error(f"Unicode decode error: {str(e)}")
-            raise ValueError(error_msg)
-        except Exception as e:
-            error_msg = f"Failed to read text file: {str(e)}"
-            logger.error(error_msg)
-            raise ValueError(error_msg)
+            if estimate_tokens(content) > settings.SUMMARY_CHUNK_TOKENS:
+                return await summary_service.summarize(content, model_name)
 
-    def _generate_ai_response(self, content: str, model_name: Optional[str] = None) -> str:
-        """Generate AI response for the file content."""
-        try:
-            logger.info("Generating AI response for content")
-            
             prompt = f"""
             Analyze the following content and provide a detailed response:
             {content}
-            
-            Please include:
-            1. The contents of the file you are analyzing
-            2. A summary of the main points
-            3. Key insights or observations
-            4. Any relevant recommendations
+            {ANALYSIS_INSTRUCTIONS}
             """
-            
-            model_name = model_name or settings.DEFAULT_MODEL
-            if model_name not in settings.AVAILABLE_MODELS:
-                model_name = settings.DEFAULT_MODEL
 
             # Configure model
             model = genai.GenerativeModel(
                 model_name=model_name,
             )
             
-            response = model.generate_content(prompt)
+            response = await model.generate_content_async(prompt)
             
             if not response.text:
                 error_msg = "AI model returned empty response"
@@ -190,17 +74,28 @@ class FileService:
             file_ext = os.path.splitext(filename)[1].lower()
             logger.info(f"Processing file: {filename} with extension: {file_ext}")
 
-            # Read file content based on type
-            if file_ext in ['.jpg', '.jpeg', '.png', '.webp','.heic','.heif','.pdf', '.mp4', '.mpeg', '.mpg', '.3gpp', '.webm', '.mp3', 'wav', '.aac', '.ogg', '.flac', '.txt', '.html', '.css', '.md']:
-                file_path = os.path.join(settings.TEMP_STORAGE_PATH, f"temp{user_id}.{file_ext}")
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            # Sniff the real type before any upload or OCR is paid for
+            extractor = extractor_registry.resolve(file, filename)
+
+            if extractor.gemini_upload:
                 file.seek(0)
                 file_content = file.read()
-                with open(file_path, "wb") as f:
+
+                # Only the downscaled copy is needed upstream; the original is not written to disk
+                file_content, upload_ext = await media_service.optimize_image(file_content, extractor.extension)
+
+                # A unique name per call: one user may have several uploads in flight
+                os.makedirs(settings.TEMP_STORAGE_PATH, exist_ok=True)
+                with tempfile.NamedTemporaryFile(dir=settings.TEMP_STORAGE_PATH, suffix=upload_ext, delete=False) as f:
                     f.write(file_content)
-                    
-                logger.info(f"File size: {os.path.getsize(file_path)}")
-                uploaded_file = genai.upload_file(path=file_path)
+                    file_path = f.name
+
+                try:
+                    logger.info(f"File size: {os.path.getsize(file_path)}")
+                    uploaded_file = await asyncio.to_thread(genai.upload_file, path=file_path)
+                finally:
+                    # Clean up temporary files
+                    os.remove(file_path)
 
                 prompt = f"""You are a helpful assistant. You are given a file. Please analyze it and provide a detailed response.
                 The response will have the following five clearly defined sections:
@@ -211,26 +106,26 @@ class FileService:
                 - Any relevant recommendations
                 """
 
-                model = genai.GenerativeModel(model_name=model_name)
-                response = model.generate_content([uploaded_file, prompt])
-                
-                # Extract the text content from the response
-                content = response.text
-
-                # Clean up temporary files
-                os.remove(file_path)
-                uploaded_file.delete()
-                
-            elif file_ext in ['.doc', '.docx']:
-                logger.info("Processing text file")
-                response = self._process_text_file(file)
-                content = await self._generate_ai_response(response, model_name)
+                try:
+                    model = genai.GenerativeModel(model_name=model_name)
+                    response = await model.generate_content_async([uploaded_file, prompt])
+
+                    # Extract the text content from the response
+                    content = response.text
+                finally:
+                    # Deleted even when generation fails, so the remote copy is not left behind
+                    try:
+                        await asyncio.to_thread(uploaded_file.delete)
+                    except Exception as e:
+                        logger.warning(f"Failed to delete uploaded file {uploaded_file.name}: {str(e)}")
+
             else:
-                error_msg = f"Unsupported file type: {file_ext}"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
+                logger.info(f"Extracting text from {extractor.name} file")
+                file.seek(0)
+                text = await cpu_pool.run(_extract_text_in_worker, file.read(), filename)
+                content = await self._generate_ai_response(text, model_name)
         
-            await content_service.save_content(
+            await content_service.queue_content(
                 user_id=user_id,
                 content_type="FILE",
                 title=filename,
@@ -247,41 +142,37 @@ class FileService:
                 "model": model_name,
                 "text": content
             }
+        except ContentWriteUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error processing file: {str(e)}")
             raise ValueError(str(e))
 
+    def _extract_text(self, file: BinaryIO, filename: str) -> str:
+        """Extract text from a file using the extractor for its sniffed type."""
+        extractor = extractor_registry.resolve(file, filename, require_text=True)
+        content = extractor.extract(file)
+
+        if not content or not content.strip():
+            error_msg = "No content could be extracted from the file"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        return content
+
     async def process_file(self, file: BinaryIO, filename: str, user_id: str, model_name: Optional[str] = None) -> Dict[str, Any]:
         """Process file based on its type."""
         try:
             file_ext = os.path.splitext(filename)[1].lower()
             logger.info(f"Processing file: {filename} with extension: {file_ext}")
 
-            # Read file content based on type
-            if file_ext in ['.jpg', '.jpeg', '.png', '.bmp', '.webp']:
-                logger.info("Processing image file")
-                content = self._process_image(file)
-            elif file_ext == '.pdf':
-                logger.info("Processing PDF file")
-                content = self._process_pdf(file)
-            elif file_ext in ['.txt', '.doc', '.docx']:
-                logger.info("Processing text file")
-                content = self._process_text_file(file)
-            else:
-                error_msg = f"Unsupported file type: {file_ext}"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-
-            if not content or not content.strip():
-                error_msg = "No content could be extracted from the file"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
+            file.seek(0)
+            content = await cpu_pool.run(_extract_text_in_worker, file.read(), filename)
 
             logger.info("Generating AI response")
-            response = self._generate_ai_response(content, model_name)
+            response = await self._generate_ai_response(content, model_name)
 
             # Save to database
-            await content_service.save_content(
+            await content_service.queue_content(
                 user_id=user_id,
                 content_type="FILE",
                 title=filename,
@@ -300,8 +191,146 @@ class FileService:
                 "text": response,
             }
 
+        except ContentWriteUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error processing file: {str(e)}")
             raise ValueError(str(e))
 
-file_service = FileService()
\ No newline at end of file
+    async def stream_file_analysis(self, file: BinaryIO, filename: str, user_id: str, model_name: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Extract and analyze a file, yielding partial summaries as they finish."""
+        file_ext = os.path.splitext(filename)[1].lower()
+        logger.info(f"Streaming analysis of file: {filename} with extension: {file_ext}")
+
+        file.seek(0)
+        content = await cpu_pool.run(_extract_text_in_worker, file.read(), filename)
+        model_name = self._resolve_model(model_name)
+
+        response = None
+        if estimate_tokens(content) > settings.SUMMARY_CHUNK_TOKENS:
+            async for event in summary_service.summarize_stream(content, model_name):
+                if event["type"] == "final":
+                    response = event["summary"]
+                else:
+                    yield event
+        else:
+            response = await self._generate_ai_response(content, model_name)
+
+        await content_service.queue_content(
+            user_id=user_id,
+            content_type="FILE",
+            title=filename,
+            content=response,
+            filename=filename,
+            metadata={
+                "original_content": content,
+                "file_type": file_ext,
+                "model": model_name
+            }
+        )
+
+        yield {"type": "final", "model": model_name, "text": response}
+
+    async def process_batch(
+        self,
+        files: List[Tuple[str, bytes]],
+        user_id: str,
+        model_name: Optional[str] = None,
+        group: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Extract and analyze many files, yielding per-file results as they complete.
+
+        Extraction runs in parallel on the CPU worker pool. With ``group`` the
+        extracted texts are analyzed together in one model call. Each result is
+        saved as soon as it is ready, so a failure later in the batch never
+        loses results already reported. A file that fails for any reason is
+        reported as that file's error.
+        """
+        model_name = self._resolve_model(model_name)
+        semaphore = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+
+        async def handle(index: int, filename: str, data: bytes):
+            file_ext = os.path.splitext(filename)[1].lower()
+            try:
+                text = await cpu_pool.run(_extract_text_in_worker, data, filename)
+                response = None
+                if not group:
+                    async with semaphore:
+                        response = await self._generate_ai_response(text, model_name)
+                return index, filename, file_ext, text, response, None
+            except Exception as e:
+                # Model, quota and worker pool errors fail this file only
+                return index, filename, file_ext, None, None, str(e)
+
+        logger.info(f"Processing batch of {len(files)} files")
+        tasks = [
+            asyncio.create_task(handle(index, filename, data))
+            for index, (filename, data) in enumerate(files)
+        ]
+        saved = 0
+        extracted = []
+        try:
+            for completed in asyncio.as_completed(tasks):
+                index, filename, file_ext, text, response, error = await completed
+                if error:
+                    logger.error(f"Error processing {filename}: {error}")
+                    yield {"type": "file", "index": index, "filename": filename, "success": False, "error": error}
+                    continue
+
+                event = {"type": "file", "index": index, "filename": filename, "success": True}
+                if group:
+                    extracted.append((index, filename, file_ext, text))
+                else:
+                    event["text"] = response
+                    await content_service.queue_content(
+                        user_id=user_id,
+                        content_type="FILE",
+                        title=filename,
+                        content=response,
+                        filename=filename,
+                        metadata={
+                            "original_content": text,
+                            "file_type": file_ext,
+                            "model": model_name
+                        }
+                    )
+                    saved += 1
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if group and extracted:
+            extracted.sort()
+            # Page breaks between files let the chunker keep each file together
+            combined = PAGE_BREAK.join(f"File: {filename}\n{text}" for _, filename, _, text in extracted)
+            filenames = [filename for _, filename, _, _ in extracted]
+            try:
+                response = await self._generate_ai_response(combined, model_name)
+            except Exception as e:
+                logger.error(f"Error analyzing batch: {str(e)}")
+                yield {"type": "analysis", "success": False, "error": str(e)}
+            else:
+                await content_service.queue_content(
+                    user_id=user_id,
+                    content_type="FILE",
+                    title=f"{len(filenames)} files: {', '.join(filenames)}"[:100],
+                    content=response,
+                    metadata={
+                        "original_content": combined,
+                        "filenames": filenames,
+                        "file_types": [file_ext for _, _, file_ext, _ in extracted],
+                        "model": model_name
+                    }
+                )
+                saved += 1
+                yield {"type": "analysis", "model": model_name, "text": response}
+
+        yield {"type": "done", "saved": saved}
+
+file_service = FileService()
+
+
+def _extract_text_in_worker(data: bytes, filename: str) -> str:
+    """Extract text from raw file bytes. Runs inside a CPU worker process."""
+    return file_service._extract_text(io.BytesIO(data), filename)
\ No newline at end of file
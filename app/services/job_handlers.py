@@ -0,0 +1,75 @@
+import logging
+import os
+from typing import Any, Dict
+from .job_service import job_service, JobContext
+from .file_service import file_service
+from .pdf_service import pdf_service
+
+logger = logging.getLogger(__name__)
+
+
+def _cleanup_upload(path: str) -> None:
+    """Remove a staged upload once no further attempt will need it."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Failed to remove staged upload {path}: {str(e)}")
+
+
+@job_service.handler("file_upload")
+async def process_uploaded_file(payload: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    """Analyze an uploaded file with Gemini."""
+    succeeded = False
+    try:
+        await ctx.progress(0.1, "Uploading file for analysis")
+        with open(payload["path"], "rb") as file:
+            result = await file_service.process_file_with_gemini(
+                file=file,
+                filename=payload["filename"],
+                user_id=payload["user_id"],
+                model_name=payload.get("model_name")
+            )
+        succeeded = True
+        return result
+    finally:
+        if succeeded or ctx.final_attempt:
+            _cleanup_upload(payload["path"])
+
+
+@job_service.handler("file_process")
+async def process_extracted_file(payload: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    """Extract text from an uploaded file and analyze it."""
+    succeeded = False
+    try:
+        await ctx.progress(0.1, "Extracting text")
+        with open(payload["path"], "rb") as file:
+            result = await file_service.process_file(
+                file=file,
+                filename=payload["filename"],
+                user_id=payload["user_id"],
+                model_name=payload.get("model_name")
+            )
+        succeeded = True
+        return result
+    finally:
+        if succeeded or ctx.final_attempt:
+            _cleanup_upload(payload["path"])
+
+
+@job_service.handler("story_pdf")
+async def generate_story_pdf(payload: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    """Generate a story and render it to PDF."""
+    await ctx.progress(0.1, "Writing story")
+    result = await pdf_service.generate_story_pdf(
+        prompt=payload["prompt"],
+        user_id=payload["user_id"],
+        model_name=payload.get("model_name"),
+        chapters=payload.get("chapters")
+    )
+    return {
+        "file_id": result["file_id"],
+        "url": f"/api/pdf/download/{result['file_id']}",
+        "title": result["title"]
+    }
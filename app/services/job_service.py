@@ -0,0 +1,402 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from ..core.config import settings
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+TERMINAL_STATUSES = (JOB_COMPLETED, JOB_FAILED)
+
+# Moves the next job to the processing list and sets its visibility deadline
+# in one step, so a worker dying after the move cannot leave a job the reaper
+# never sees
+CLAIM_SCRIPT = """
+local job_id = redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'LEFT')
+if job_id then
+    redis.call('ZADD', KEYS[3], ARGV[1], job_id)
+end
+return job_id
+"""
+
+
+class JobContext:
+    """Handle passed to job handlers for reporting progress."""
+
+    def __init__(self, service: "JobService", job: Dict[str, Any]):
+        self._service = service
+        self.job_id = job["id"]
+        self.attempt = job["attempts"]
+        self.final_attempt = job["attempts"] >= settings.JOB_MAX_ATTEMPTS
+
+    async def progress(self, progress: float, message: Optional[str] = None) -> None:
+        """Report handler progress as a fraction between 0 and 1."""
+        fields = {"progress": round(min(max(progress, 0.0), 1.0), 3)}
+        if message:
+            fields["message"] = message
+        await self._service.backend.update(self.job_id, fields)
+
+
+JobHandler = Callable[[Dict[str, Any], JobContext], Awaitable[Dict[str, Any]]]
+
+
+class RedisJobBackend:
+    """Job storage on Redis lists, with a sorted set tracking in-flight visibility deadlines."""
+
+    queue_key = "jobs:queue"
+    processing_key = "jobs:processing"
+    inflight_key = "jobs:inflight"
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._claim = self.redis.register_script(CLAIM_SCRIPT)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def _channel(self, job_id: str) -> str:
+        return f"job:{job_id}:events"
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job["id"]), mapping=self._encode(job))
+        pipe.lpush(self.queue_key, job["id"])
+        await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = await self.redis.hgetall(self._job_key(job_id))
+        return self._decode(data) if data else None
+
+    async def update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        fields = {**fields, "updated_at": time.time()}
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping=self._encode(fields))
+        if fields.get("status") in TERMINAL_STATUSES:
+            pipe.expire(self._job_key(job_id), settings.JOB_RESULT_TTL)
+        pipe.publish(self._channel(job_id), json.dumps({"id": job_id, **fields}))
+        await pipe.execute()
+
+    async def claim(self, timeout: float) -> Optional[str]:
+        # Scripts cannot block, so an empty queue is polled until the timeout
+        give_up = time.monotonic() + timeout
+        while True:
+            job_id = await self._claim(
+                keys=[self.queue_key, self.processing_key, self.inflight_key],
+                args=[time.time() + settings.JOB_VISIBILITY_TIMEOUT]
+            )
+            remaining = give_up - time.monotonic()
+            if job_id or remaining <= 0:
+                return job_id
+            await asyncio.sleep(min(settings.JOB_CLAIM_POLL_INTERVAL, remaining))
+
+    async def extend(self, job_id: str) -> None:
+        deadline = time.time() + settings.JOB_VISIBILITY_TIMEOUT
+        await self.redis.zadd(self.inflight_key, {job_id: deadline})
+
+    async def ack(self, job_id: str) -> None:
+        pipe = self.redis.pipeline()
+        pipe.lrem(self.processing_key, 0, job_id)
+        pipe.zrem(self.inflight_key, job_id)
+        await pipe.execute()
+
+    async def requeue(self, job_id: str) -> None:
+        pipe = self.redis.pipeline()
+        pipe.lrem(self.processing_key, 0, job_id)
+        pipe.zrem(self.inflight_key, job_id)
+        pipe.lpush(self.queue_key, job_id)
+        await pipe.execute()
+
+    async def expired(self) -> List[str]:
+        """Return in-flight jobs whose visibility deadline passed, claiming each for this caller."""
+        job_ids = await self.redis.zrangebyscore(self.inflight_key, 0, time.time())
+        claimed = []
+        for job_id in job_ids:
+            # ZREM succeeds for exactly one reaper, so a job is never recovered twice
+            if await self.redis.zrem(self.inflight_key, job_id):
+                claimed.append(job_id)
+        return claimed
+
+    async def events(self, job_id: str, idle_timeout: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield the current job state, then every update. Yields None when idle."""
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self._channel(job_id))
+        try:
+            yield await self.get(job_id)
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=idle_timeout
+                )
+                yield json.loads(message["data"]) if message else None
+        finally:
+            await pubsub.unsubscribe(self._channel(job_id))
+            await pubsub.close()
+
+    def _encode(self, fields: Dict[str, Any]) -> Dict[str, str]:
+        encoded = {}
+        for key, value in fields.items():
+            if key in ("payload", "result"):
+                value = json.dumps(value)
+            encoded[key] = "" if value is None else str(value)
+        return encoded
+
+    def _decode(self, data: Dict[str, str]) -> Dict[str, Any]:
+        job = dict(data)
+        for key in ("payload", "result"):
+            job[key] = json.loads(job[key]) if job.get(key) else None
+        for key in ("attempts",):
+            job[key] = int(job.get(key) or 0)
+        for key in ("progress", "created_at", "updated_at"):
+            job[key] = float(job.get(key) or 0)
+        for key in ("error", "message"):
+            job[key] = job.get(key) or None
+        return job
+
+
+class LocalJobBackend:
+    """In-process job storage for tests and single-node development."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._inflight: Dict[str, float] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # Created lazily so it binds to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = dict(job)
+        self.queue.put_nowait(job["id"])
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        if job_id not in self._jobs:
+            return
+        fields = {**fields, "updated_at": time.time()}
+        self._jobs[job_id].update(fields)
+        for subscriber in self._subscribers.get(job_id, []):
+            subscriber.put_nowait({"id": job_id, **fields})
+
+    async def claim(self, timeout: float) -> Optional[str]:
+        try:
+            job_id = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        await self.extend(job_id)
+        return job_id
+
+    async def extend(self, job_id: str) -> None:
+        self._inflight[job_id] = time.time() + settings.JOB_VISIBILITY_TIMEOUT
+
+    async def ack(self, job_id: str) -> None:
+        self._inflight.pop(job_id, None)
+
+    async def requeue(self, job_id: str) -> None:
+        self._inflight.pop(job_id, None)
+        self.queue.put_nowait(job_id)
+
+    async def expired(self) -> List[str]:
+        now = time.time()
+        job_ids = [job_id for job_id, deadline in self._inflight.items() if deadline <= now]
+        for job_id in job_ids:
+            del self._inflight[job_id]
+        return job_ids
+
+    async def events(self, job_id: str, idle_timeout: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        subscriber: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(subscriber)
+        try:
+            yield await self.get(job_id)
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber.get(), idle_timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._subscribers[job_id].remove(subscriber)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+
+class JobService:
+    def __init__(self):
+        if settings.JOB_BACKEND == "local":
+            self.backend = LocalJobBackend()
+        else:
+            self.backend = RedisJobBackend(cache_service.redis)
+        self._handlers: Dict[str, JobHandler] = {}
+        self._local_workers: List[asyncio.Task] = []
+        self._local_stop: Optional[asyncio.Event] = None
+        logger.info(f"Job Service initialized with {settings.JOB_BACKEND} backend")
+
+    def handler(self, job_type: str) -> Callable[[JobHandler], JobHandler]:
+        """Register a coroutine as the handler for a job type."""
+        def decorator(func: JobHandler) -> JobHandler:
+            self._handlers[job_type] = func
+            return func
+        return decorator
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Queue a job and return its initial state."""
+        try:
+            now = time.time()
+            job = {
+                "id": uuid.uuid4().hex,
+                "type": job_type,
+                "user_id": user_id,
+                "status": JOB_QUEUED,
+                "progress": 0.0,
+                "message": None,
+                "attempts": 0,
+                "payload": payload,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            await self.backend.create(job)
+            logger.info(f"Enqueued {job_type} job {job['id']} for user {user_id}")
+            return job
+        except Exception as e:
+            logger.error(f"Failed to enqueue job: {str(e)}")
+            raise
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the current state of a job."""
+        return await self.backend.get(job_id)
+
+    async def stream_events(self, job_id: str, idle_timeout: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield job state updates until the job finishes. Yields None while idle."""
+        events = self.backend.events(job_id, idle_timeout)
+        try:
+            async for event in events:
+                yield event
+                if event and event.get("status") in TERMINAL_STATUSES:
+                    break
+        finally:
+            await events.aclose()
+
+    async def run_worker(self, concurrency: int, stop: Optional[asyncio.Event] = None) -> None:
+        """Claim and execute jobs until stopped."""
+        stop = stop or asyncio.Event()
+        slots = asyncio.Semaphore(concurrency)
+        running = set()
+        reaper = asyncio.create_task(self._reap_loop(stop))
+        logger.info(f"Job worker started with concurrency {concurrency}")
+        try:
+            while not stop.is_set():
+                await slots.acquire()
+                if stop.is_set():
+                    slots.release()
+                    break
+                try:
+                    job_id = await self.backend.claim(timeout=1)
+                except Exception as e:
+                    slots.release()
+                    logger.error(f"Failed to claim job: {str(e)}")
+                    await asyncio.sleep(1)
+                    continue
+                if not job_id:
+                    slots.release()
+                    continue
+                task = asyncio.create_task(self._execute(job_id))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                task.add_done_callback(lambda _: slots.release())
+        finally:
+            reaper.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            logger.info("Job worker stopped")
+
+    async def _execute(self, job_id: str) -> None:
+        job = await self.backend.get(job_id)
+        if not job or job["status"] in TERMINAL_STATUSES:
+            await self.backend.ack(job_id)
+            return
+
+        handler = self._handlers.get(job["type"])
+        if not handler:
+            await self.backend.update(job_id, {"status": JOB_FAILED, "error": f"Unknown job type: {job['type']}"})
+            await self.backend.ack(job_id)
+            return
+
+        job["attempts"] += 1
+        await self.backend.update(job_id, {"status": JOB_RUNNING, "attempts": job["attempts"]})
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await handler(job["payload"], JobContext(self, job))
+        except Exception as e:
+            logger.error(f"Job {job_id} attempt {job['attempts']} failed: {str(e)}")
+            await self._retry_or_fail(job_id, job["attempts"], str(e))
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self.backend.update(job_id, {"status": JOB_COMPLETED, "progress": 1.0, "result": result})
+        await self.backend.ack(job_id)
+        logger.info(f"Job {job_id} completed")
+
+    async def _retry_or_fail(self, job_id: str, attempts: int, error: str) -> None:
+        if attempts < settings.JOB_MAX_ATTEMPTS:
+            await self.backend.update(job_id, {"status": JOB_QUEUED, "error": error})
+            await self.backend.requeue(job_id)
+        else:
+            await self.backend.update(job_id, {"status": JOB_FAILED, "error": error})
+            await self.backend.ack(job_id)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """Keep a long-running job visible to this worker only."""
+        interval = max(settings.JOB_VISIBILITY_TIMEOUT / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            await self.backend.extend(job_id)
+
+    async def _reap_loop(self, stop: asyncio.Event) -> None:
+        """Requeue jobs whose worker died before acknowledging them."""
+        while not stop.is_set():
+            try:
+                for job_id in await self.backend.expired():
+                    job = await self.backend.get(job_id)
+                    if not job or job["status"] in TERMINAL_STATUSES:
+                        await self.backend.ack(job_id)
+                        continue
+                    logger.warning(f"Job {job_id} exceeded its visibility timeout")
+                    await self._retry_or_fail(job_id, job["attempts"], "Worker timed out")
+            except Exception as e:
+                logger.error(f"Failed to reap expired jobs: {str(e)}")
+            await asyncio.sleep(max(settings.JOB_VISIBILITY_TIMEOUT / 6, 1))
+
+    def start_local_workers(self) -> None:
+        """Run workers inside the API process when using the local backend."""
+        if not isinstance(self.backend, LocalJobBackend) or self._local_workers:
+            return
+        self._local_stop = asyncio.Event()
+        self._local_workers.append(
+            asyncio.create_task(self.run_worker(settings.JOB_WORKER_CONCURRENCY, self._local_stop))
+        )
+
+    async def stop_local_workers(self) -> None:
+        """Stop in-process workers and wait for running jobs."""
+        if not self._local_workers:
+            return
+        self._local_stop.set()
+        await asyncio.gather(*self._local_workers, return_exceptions=True)
+        self._local_workers = []
+
+
+job_service = JobService()
@@ -0,0 +1,77 @@
+import io
+import logging
+from typing import Tuple
+from PIL import Image, ImageOps
+from ..core.config import settings
+from ..core.executor import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+try:
+    # HEIC/HEIF decoding for phone photos is optional
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    HEIF_SUPPORTED = True
+except ImportError:
+    HEIF_SUPPORTED = False
+
+OPTIMIZABLE_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.heic', '.heif']
+
+_FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+
+def _optimize_image(data: bytes, max_dimension: int, image_format: str, quality: int) -> Tuple[bytes, str]:
+    """Downscale and re-encode an image. Runs inside a worker process."""
+    with Image.open(io.BytesIO(data)) as image:
+        # Apply the EXIF orientation before metadata is dropped
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        output = io.BytesIO()
+        # No exif/icc arguments are passed, so metadata is stripped
+        image.save(output, format=image_format, quality=quality, optimize=True)
+        return output.getvalue(), _FORMAT_EXTENSIONS[image_format]
+
+
+class MediaService:
+    def __init__(self):
+        logger.info(f"Media Service initialized (HEIF support: {HEIF_SUPPORTED})")
+
+    def can_optimize(self, file_ext: str) -> bool:
+        """Whether an upload with this extension can be optimized before upload."""
+        if file_ext in ('.heic', '.heif') and not HEIF_SUPPORTED:
+            return False
+        return settings.MEDIA_OPTIMIZE_IMAGES and file_ext in OPTIMIZABLE_IMAGE_EXTENSIONS
+
+    async def optimize_image(self, data: bytes, file_ext: str) -> Tuple[bytes, str]:
+        """Resize an image to the model's useful resolution and re-encode it.
+
+        Returns the new bytes and extension. The original is returned unchanged
+        if it cannot be decoded or optimization would not make it smaller.
+        """
+        if not self.can_optimize(file_ext):
+            return data, file_ext
+        try:
+            optimized, optimized_ext = await cpu_pool.run(
+                _optimize_image,
+                data,
+                settings.MEDIA_MAX_IMAGE_DIMENSION,
+                settings.MEDIA_IMAGE_FORMAT,
+                settings.MEDIA_IMAGE_QUALITY
+            )
+        except Exception as e:
+            logger.warning(f"Image optimization failed, uploading original: {str(e)}")
+            return data, file_ext
+
+        if len(optimized) >= len(data):
+            return data, file_ext
+        logger.info(f"Optimized image from {len(data)} to {len(optimized)} bytes")
+        return optimized, optimized_ext
+
+
+media_service = MediaService()
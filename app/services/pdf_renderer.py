@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate, Paragraph, Spacer
+from ..core.config import settings
+from ..core.executor import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Page start times for the document currently being built in this process
+_page_marks: List[float] = []
+
+
+def _mark_page(canvas, doc) -> None:
+    _page_marks.append(time.perf_counter())
+
+
+@lru_cache(maxsize=1)
+def _styles() -> Dict[str, ParagraphStyle]:
+    """Build the story paragraph styles once per process."""
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Title'],
+            fontSize=24,
+            spaceAfter=30
+        ),
+        "heading": ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            spaceBefore=12,
+            spaceAfter=12
+        ),
+        "body": ParagraphStyle(
+            'CustomBody',
+            parent=styles['Normal'],
+            fontSize=12,
+            leading=14,
+            spaceAfter=10
+        )
+    }
+
+
+def _new_page_template(on_page) -> PageTemplate:
+    margin = inch
+    width, height = letter
+    frame = Frame(margin, margin, width - 2 * margin, height - 2 * margin, id='normal')
+    return PageTemplate(id='story', frames=[frame], onPage=on_page, pagesize=letter)
+
+
+@lru_cache(maxsize=1)
+def _page_template() -> PageTemplate:
+    """Build the letter-size page template once per process."""
+    return _new_page_template(_mark_page)
+
+
+def warm_renderer() -> None:
+    """Import ReportLab and compile styles and templates in a new worker process."""
+    _styles()
+    _page_template()
+
+
+def story_flowables(title: Optional[str], paragraphs: List[str], heading: Optional[str] = None) -> List[Any]:
+    """Lay out a title, an optional chapter heading and paragraphs as ReportLab flowables."""
+    styles = _styles()
+    flowables = []
+    if title is not None:
+        flowables.append(Paragraph(escape(title), styles["title"]))
+        flowables.append(Spacer(1, 12))
+    if heading is not None:
+        flowables.append(Paragraph(escape(heading), styles["heading"]))
+    for paragraph in paragraphs:
+        if paragraph.strip():
+            flowables.append(Paragraph(escape(paragraph), styles["body"]))
+            flowables.append(Spacer(1, 12))
+    return flowables
+
+
+def _render_story(story_data: Dict) -> Tuple[bytes, Dict]:
+    """Render a story to PDF. Runs inside a render worker process.
+
+    Returns the PDF bytes and render metrics.
+    """
+    started = time.perf_counter()
+    _page_marks.clear()
+
+    buffer = BytesIO()
+    doc = BaseDocTemplate(buffer, pagesize=letter, pageTemplates=[_page_template()])
+    doc.build(story_flowables(story_data["title"], story_data["content"].split('\n\n')))
+    finished = time.perf_counter()
+
+    marks = _page_marks + [finished]
+    metrics = {
+        "pages": len(_page_marks),
+        "render_seconds": round(finished - started, 4),
+        "page_seconds": [round(end - start, 4) for start, end in zip(marks, marks[1:])]
+    }
+
+    pdf_content = buffer.getvalue()
+    metrics["bytes"] = len(pdf_content)
+    return pdf_content, metrics
+
+
+class StoryDocument:
+    """A story PDF laid out page by page as paragraphs arrive.
+
+    ReportLab document state cannot cross a process boundary, so a streamed
+    story is laid out on a worker thread in small steps instead of the render
+    pool. Each ``add`` call lays out only the new paragraphs.
+    """
+
+    def __init__(self):
+        self._buffer = BytesIO()
+        self._page_marks: List[float] = []
+        # Layout time only; time spent waiting for the model is not render time
+        self._page_seconds: List[float] = []
+        self._doc = BaseDocTemplate(
+            self._buffer,
+            pagesize=letter,
+            pageTemplates=[_new_page_template(self._mark_page)]
+        )
+        self._doc._startBuild()
+
+    def _mark_page(self, canvas, doc) -> None:
+        self._page_marks.append(time.perf_counter())
+
+    @property
+    def pages(self) -> int:
+        """Pages started so far; all but the last are fully laid out."""
+        return len(self._page_marks)
+
+    def _layout(self, flowables: List[Any]) -> None:
+        doc = self._doc
+        doc.canv._doctemplate = doc
+        try:
+            while flowables:
+                started = time.perf_counter()
+                doc.clean_hanging()
+                doc.handle_flowable(flowables)
+                self._add_page_time(time.perf_counter() - started)
+        finally:
+            del doc.canv._doctemplate
+
+    def _add_page_time(self, seconds: float) -> None:
+        while len(self._page_seconds) < max(self.pages, 1):
+            self._page_seconds.append(0.0)
+        self._page_seconds[-1] += seconds
+
+    def _finish(self) -> Tuple[bytes, Dict]:
+        started = time.perf_counter()
+        self._doc._endBuild()
+        self._add_page_time(time.perf_counter() - started)
+        pdf_content = self._buffer.getvalue()
+        metrics = {
+            "pages": len(self._page_marks),
+            "render_seconds": round(sum(self._page_seconds), 4),
+            "page_seconds": [round(seconds, 4) for seconds in self._page_seconds],
+            "bytes": len(pdf_content)
+        }
+        return pdf_content, metrics
+
+    async def add(
+        self,
+        title: Optional[str] = None,
+        paragraphs: Optional[List[str]] = None,
+        heading: Optional[str] = None
+    ) -> int:
+        """Lay out a title, chapter heading and/or paragraphs, returning the page count."""
+        await asyncio.to_thread(self._layout, story_flowables(title, paragraphs or [], heading))
+        return self.pages
+
+    async def finish(self) -> Tuple[bytes, Dict]:
+        """Flush the last page and return the PDF bytes and render metrics."""
+        pdf_content, metrics = await asyncio.to_thread(self._finish)
+        pdf_renderer.record(metrics)
+        return pdf_content, metrics
+
+
+class PDFRenderer:
+    def __init__(self):
+        self.pool = WorkerPool(
+            "pdf",
+            max_workers=settings.PDF_RENDER_PROCESSES,
+            max_pending=settings.PDF_RENDER_MAX_PENDING,
+            initializer=warm_renderer
+        )
+        self._stats = {"documents": 0, "pages": 0, "render_seconds": 0.0, "slowest_page_seconds": 0.0}
+        logger.info("PDF Renderer initialized")
+
+    async def start(self) -> None:
+        """Start the render processes so the first request does not pay for it."""
+        await self.pool.run(warm_renderer)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown()
+
+    async def render(self, story_data: Dict) -> Tuple[bytes, Dict]:
+        """Render a story off the event loop, returning the PDF bytes and render metrics."""
+        pdf_content, metrics = await self.pool.run(_render_story, story_data)
+        self.record(metrics)
+        return pdf_content, metrics
+
+    def record(self, metrics: Dict) -> None:
+        """Add a document's render metrics to the process-wide totals."""
+        self._stats["documents"] += 1
+        self._stats["pages"] += metrics["pages"]
+        self._stats["render_seconds"] += metrics["render_seconds"]
+        self._stats["slowest_page_seconds"] = max(
+            [self._stats["slowest_page_seconds"], *metrics["page_seconds"]]
+        )
+        logger.info(
+            f"Rendered PDF: {metrics['pages']} pages in {metrics['render_seconds']}s "
+            f"({metrics['render_seconds'] / max(metrics['pages'], 1):.4f}s/page)"
+        )
+
+    def metrics(self) -> Dict:
+        """Aggregate render metrics for this API process."""
+        stats = dict(self._stats)
+        stats["seconds_per_page"] = round(stats["render_seconds"] / stats["pages"], 4) if stats["pages"] else 0.0
+        return stats
+
+
+pdf_renderer = PDFRenderer()
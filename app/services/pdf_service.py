@@ -1,18 +1,15 @@
+import asyncio
 import json
 import logging
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import google.generativeai as genai
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.units import inch
-from io import BytesIO
 from app.core.config import settings
 from app.services.cache_service import cache_service
 from app.services.content_service import content_service
-import uuid
-import os
+from app.services.pdf_renderer import pdf_renderer, StoryDocument
+from app.services.pdf_storage import pdf_storage
+from app.services.storage_manager import storage_manager
+from app.services.story_stream import StoryStreamParser
 
 logger = logging.getLogger(__name__)
 
@@ -21,51 +18,8 @@ class PDFService:
         self.cache = cache_service
         logger.info("PDF Service initialized")
 
-    def _create_pdf(self, story_data: Dict) -> bytes:
-        """Create a PDF document from story data."""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-
-        # Add title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Title'],
-            fontSize=24,
-            spaceAfter=30
-        )
-        story.append(Paragraph(story_data["title"], title_style))
-        story.append(Spacer(1, 12))
-
-        # Add content
-        content_style = ParagraphStyle(
-            'CustomBody',
-            parent=styles['Normal'],
-            fontSize=12,
-            leading=14,
-            spaceAfter=10
-        )
-        
-        # Split content into paragraphs
-        paragraphs = story_data["content"].split('\n\n')
-        for paragraph in paragraphs:
-            if paragraph.strip():
-                story.append(Paragraph(paragraph, content_style))
-                story.append(Spacer(1, 12))
-
-        doc.build(story)
-        return buffer.getvalue()
-
-    async def generate_story_pdf(self, prompt: str, user_id: str, model_name: Optional[str] = None) -> Dict:
-        """Generate a PDF story from a prompt."""
-        try:
-            # Generate story content using Gemini
-            model = genai.GenerativeModel(
-                model_name=model_name or settings.DEFAULT_MODEL
-            )
-            
-            structured_prompt = f"""
+    def _story_prompt(self, prompt: str) -> str:
+        return f"""
             Create a modern and engaging story based on this prompt: {prompt}
             Format the response as a JSON object with the following structure:
             {{
@@ -74,47 +28,55 @@ class PDFService:
             }}
             The story should be at least 2 pages and at most 10 pages long.
             """
-            
-            response = model.generate_content(structured_prompt)
-            
-            # Parse the JSON from the response text
-            try:
-                # Find the JSON object in the response
-                text = response.text
-                start_idx = text.find('{')
-                end_idx = text.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = text[start_idx:end_idx]
-                    story_data = json.loads(json_str)
-                else:
-                    # Fallback if no JSON is found
-                    story_data = {
-                        "title": "Generated Story",
-                        "content": text
-                    }
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                story_data = {
-                    "title": "Generated Story",
-                    "content": response.text
-                }
 
-            # Generate PDF
-            pdf_content = self._create_pdf(story_data)
-            
-            # Generate unique file ID
-            file_id = f"{uuid.uuid4()}.pdf"
-            
-            # Save PDF to file system
-            pdf_path = os.path.join(settings.PDF_STORAGE_PATH, file_id)
-            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
-            
-            with open(pdf_path, 'wb') as f:
-                f.write(pdf_content)
+    async def generate_story_pdf(
+        self,
+        prompt: str,
+        user_id: str,
+        model_name: Optional[str] = None,
+        chapters: Optional[int] = None
+    ) -> Dict:
+        """Generate a PDF story from a prompt.
+
+        With ``chapters`` the story is planned first and its chapters are written in parallel.
+        """
+        try:
+            if chapters:
+                async for event in self.stream_planned_story_pdf(prompt, user_id, model_name, chapters):
+                    if event["type"] == "complete":
+                        return {
+                            "file_id": event["file_id"],
+                            "path": event["path"],
+                            "url": f"/api/pdf/{event['file_id']}",
+                            "title": event["title"]
+                        }
+                # Falling through would pay for a second, unplanned story
+                raise RuntimeError("Planned story generation ended without a result")
+
+            # Refuse before paying for generation when there is nowhere to put the result
+            await storage_manager.check_quota(user_id)
+
+            # Generate story content using Gemini
+            model = genai.GenerativeModel(
+                model_name=model_name or settings.DEFAULT_MODEL
+            )
+
+            response = await model.generate_content_async(self._story_prompt(prompt))
+
+            # Same parser as the streaming path, so malformed output is handled alike
+            parser = StoryStreamParser()
+            parser.feed(response.text)
+            parser.finish()
+            story_data = {"title": parser.title, "content": parser.content}
+
+            # Render off the event loop, then store under the content hash
+            pdf_content, render_metrics = await pdf_renderer.render(story_data)
+            file_id = await storage_manager.store(user_id, pdf_content)
+            pdf_path = pdf_storage.location(file_id)
 
             # Save to database
             file_url = f"/api/pdf/{file_id}"  # URL where the PDF can be accessed
-            await content_service.save_content(
+            await content_service.queue_content(
                 user_id=user_id,
                 content_type="PDF",
                 title=story_data["title"],
@@ -124,7 +86,8 @@ class PDFService:
                 metadata={
                     "prompt": prompt,
                     "model": model_name,
-                    "file_path": pdf_path
+                    "file_path": pdf_path,
+                    "render": render_metrics
                 }
             )
 
@@ -139,8 +102,232 @@ class PDFService:
             logger.error(f"Error generating story PDF: {str(e)}")
             raise
         
+    async def stream_story_pdf(self, prompt: str, user_id: str, model_name: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Generate a story PDF, laying out pages while the story streams in.
+
+        Yields ``title``, ``paragraph`` and ``page`` progress events, then a
+        ``complete`` event as soon as the finished PDF is on disk.
+        """
+        await storage_manager.check_quota(user_id)
+        model = genai.GenerativeModel(
+            model_name=model_name or settings.DEFAULT_MODEL
+        )
+        parser = StoryStreamParser()
+        document = StoryDocument()
+        pages = 0
+        paragraph_count = 0
+        # Paragraphs that arrive before the title are held so the title stays first.
+        # parser.title is set as soon as a chunk is parsed, even while earlier
+        # paragraphs from that chunk are still being laid out, so it is not used here.
+        held = []
+        titled = False
+
+        async def lay_out(events):
+            nonlocal pages, paragraph_count, held, titled
+            for kind, text in events:
+                if kind == "title":
+                    titled = True
+                    yield {"type": "title", "title": text}
+                    new_pages = await document.add(title=text, paragraphs=held)
+                    held = []
+                else:
+                    yield {"type": "paragraph", "index": paragraph_count, "text": text}
+                    paragraph_count += 1
+                    if not titled:
+                        held.append(text)
+                        continue
+                    new_pages = await document.add(paragraphs=[text])
+                if new_pages > pages:
+                    pages = new_pages
+                    yield {"type": "page", "pages": pages}
+
+        yield {"type": "status", "message": "Writing story"}
+        response = await model.generate_content_async(self._story_prompt(prompt), stream=True)
+        async for chunk in response:
+            async for event in lay_out(parser.feed(chunk.text)):
+                yield event
+        async for event in lay_out(parser.finish()):
+            yield event
+
+        yield await self._finish_streamed_story(
+            document, parser.title, parser.content, prompt, user_id, model_name
+        )
+
+    async def _finish_streamed_story(
+        self,
+        document: StoryDocument,
+        title: str,
+        content: str,
+        prompt: str,
+        user_id: str,
+        model_name: Optional[str],
+        metadata: Optional[Dict] = None
+    ) -> Dict:
+        """Flush a streamed story to storage and return its ``complete`` event."""
+        pdf_content, render_metrics = await document.finish()
+        file_id = await storage_manager.store(user_id, pdf_content)
+        pdf_path = pdf_storage.location(file_id)
+        file_url = f"/api/pdf/{file_id}"
+
+        # The PDF is downloadable now; the row is written behind
+        await content_service.queue_content(
+            user_id=user_id,
+            content_type="PDF",
+            title=title,
+            content=content,
+            filename=file_id,
+            file_url=file_url,
+            metadata={
+                "prompt": prompt,
+                "model": model_name,
+                "file_path": pdf_path,
+                "render": render_metrics,
+                **(metadata or {})
+            }
+        )
+
+        return {
+            "type": "complete",
+            "file_id": file_id,
+            "path": pdf_path,
+            "url": f"/api/pdf/download/{file_id}",
+            "title": title,
+            "pages": render_metrics["pages"]
+        }
+
+    def _outline_prompt(self, prompt: str, chapters: int) -> str:
+        return f"""
+            Plan a modern and engaging story based on this prompt: {prompt}
+            Divide it into exactly {chapters} chapters.
+            Format the response as a JSON object with the following structure:
+            {{
+                "title": "Story Title",
+                "premise": "Two or three sentences describing the setting, characters and tone",
+                "chapters": [
+                    {{"title": "Chapter title", "summary": "What happens in this chapter"}}
+                ]
+            }}
+            """
+
+    def _chapter_prompt(self, plan: Dict, index: int) -> str:
+        outline = "\n".join(
+            f"{i + 1}. {chapter['title']}: {chapter['summary']}"
+            for i, chapter in enumerate(plan["chapters"])
+        )
+        chapter = plan["chapters"][index]
+        return f"""
+            You are writing one chapter of a story titled "{plan['title']}".
+            Premise: {plan['premise']}
+            Full outline:
+            {outline}
+
+            Write chapter {index + 1}, "{chapter['title']}", in about one page.
+            Keep names, tone and events consistent with the outline, and end where
+            the next chapter begins. Respond with the chapter text only, as plain
+            paragraphs separated by blank lines, without the chapter title.
+            """
+
+    async def _plan_story(self, prompt: str, chapters: int, model_name: str) -> Dict:
+        """Ask the model for a title, premise and chapter outline."""
+        model = genai.GenerativeModel(model_name=model_name)
+        response = await model.generate_content_async(self._outline_prompt(prompt, chapters))
+        text = response.text
+        try:
+            plan = json.loads(text[text.find('{'):text.rfind('}') + 1])
+            plan_chapters = [
+                {"title": str(c.get("title") or f"Chapter {i + 1}"), "summary": str(c.get("summary") or "")}
+                for i, c in enumerate(plan["chapters"])
+            ]
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            logger.error(f"Could not parse story outline: {str(e)}")
+            raise ValueError("Failed to plan the story")
+        if not plan_chapters:
+            raise ValueError("Failed to plan the story")
+        return {
+            "title": str(plan.get("title") or "Generated Story"),
+            "premise": str(plan.get("premise") or prompt),
+            "chapters": plan_chapters
+        }
+
+    async def _write_chapters(self, plan: Dict, model_name: str) -> AsyncIterator[Tuple[int, str]]:
+        """Write all chapters concurrently, yielding ``(index, text)`` as each finishes."""
+        model = genai.GenerativeModel(model_name=model_name)
+        semaphore = asyncio.Semaphore(settings.STORY_CHAPTER_CONCURRENCY)
+
+        async def write(index: int) -> Tuple[int, str]:
+            async with semaphore:
+                response = await model.generate_content_async(self._chapter_prompt(plan, index))
+                return index, response.text.strip()
+
+        tasks = [asyncio.create_task(write(i)) for i in range(len(plan["chapters"]))]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield await completed
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_planned_story_pdf(
+        self,
+        prompt: str,
+        user_id: str,
+        model_name: Optional[str] = None,
+        chapters: int = 4
+    ) -> AsyncIterator[Dict]:
+        """Generate a story from an outline, writing its chapters in parallel.
+
+        Chapters are laid out in order as soon as every earlier chapter has
+        arrived, so total latency follows the slowest chapter rather than the sum.
+        """
+        await storage_manager.check_quota(user_id)
+        model_name = model_name or settings.DEFAULT_MODEL
+        yield {"type": "status", "message": "Planning story"}
+        plan = await self._plan_story(prompt, chapters, model_name)
+        yield {
+            "type": "outline",
+            "title": plan["title"],
+            "chapters": [chapter["title"] for chapter in plan["chapters"]]
+        }
+
+        document = StoryDocument()
+        pages = await document.add(title=plan["title"])
+        texts: List[Optional[str]] = [None] * len(plan["chapters"])
+        next_index = 0
+        async for index, text in self._write_chapters(plan, model_name):
+            texts[index] = text
+            yield {"type": "chapter", "index": index, "title": plan["chapters"][index]["title"]}
+
+            while next_index < len(texts) and texts[next_index] is not None:
+                new_pages = await document.add(
+                    heading=plan["chapters"][next_index]["title"],
+                    paragraphs=texts[next_index].split('\n\n')
+                )
+                next_index += 1
+                if new_pages > pages:
+                    pages = new_pages
+                    yield {"type": "page", "pages": pages}
+
+        content = "\n\n".join(
+            f"{chapter['title']}\n\n{text}" for chapter, text in zip(plan["chapters"], texts)
+        )
+        yield await self._finish_streamed_story(
+            document, plan["title"], content, prompt, user_id, model_name,
+            metadata={"chapters": [chapter["title"] for chapter in plan["chapters"]]}
+        )
+
     def get_pdf_path(self, file_id: str) -> str:
-        """Get the path to a generated PDF file."""
-        return os.path.join(settings.PDF_STORAGE_PATH, file_id)
+        """Get the local path to a generated PDF."""
+        path = pdf_storage.local_path(file_id)
+        if path is None:
+            raise ValueError("File not found")
+        return path
+
+    async def get_pdf_redirect(self, file_id: str, method: str = "GET") -> Optional[str]:
+        """A presigned URL to send the client to, when PDFs are stored remotely."""
+        return await pdf_storage.presigned_url(file_id, method)
+
+    def content_hash(self, file_id: str) -> Optional[str]:
+        """The SHA-256 a file id was derived from, if the id is content-addressed."""
+        return pdf_storage.content_hash(file_id)
 
 pdf_service = PDFService() 
\ No newline at end of file
@@ -0,0 +1,468 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from ..core.config import settings
+from ..core.database import db
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# File ids named after the SHA-256 of their content
+CONTENT_ADDRESS_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+PDF_EXTENSION = ".pdf"
+
+# (file id, bytes, modified timestamp) as listed by a backend
+BlobInfo = Tuple[str, int, float]
+
+# Seconds a deletion tombstone outlives a deleter that died mid-delete
+DELETE_TOMBSTONE_TTL = 60
+
+# Takes a reference and reports whether the blob is being deleted
+TAKE_REF_SCRIPT = """
+redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+return redis.call('EXISTS', KEYS[2])
+"""
+
+# Applies a change to a reference count; at zero or below, drops the count and
+# leaves a tombstone in the same step, so a put arriving later knows to wait
+# for the deletion and write the blob again
+RELEASE_SCRIPT = """
+local refs = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if refs > 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[4])
+return 1
+"""
+
+# Adds a blob to its shard's usage unless it is already counted, so two puts
+# racing to write the same new blob count it once. Removal always subtracts,
+# since only the caller that actually deleted the blob gets here.
+COUNT_BLOB_SCRIPT = """
+if tonumber(ARGV[4]) > 0 then
+    if redis.call('HSETNX', KEYS[1], ARGV[1], 1) == 0 then
+        return 0
+    end
+else
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+redis.call('HINCRBY', KEYS[2], ARGV[2] .. ':bytes', ARGV[3])
+redis.call('HINCRBY', KEYS[2], ARGV[2] .. ':blobs', ARGV[4])
+return 1
+"""
+
+# Clears a tombstone only if it is still ours
+CLEAR_TOMBSTONE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write a file through a temporary name so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _scan_local(shard_path: str, tmp_max_age: int) -> Tuple[List[BlobInfo], int]:
+    """List the blobs under one first-level shard, removing stale temp files."""
+    blobs = []
+    removed = 0
+    now = time.time()
+    try:
+        subdirs = list(os.scandir(shard_path))
+    except FileNotFoundError:
+        return blobs, removed
+    for subdir in subdirs:
+        if not subdir.is_dir():
+            continue
+        for entry in os.scandir(subdir.path):
+            stat = entry.stat()
+            if entry.name.endswith(".tmp"):
+                # Left behind by a write that died between create and rename
+                if now - stat.st_mtime > tmp_max_age:
+                    os.remove(entry.path)
+                    removed += 1
+            elif entry.name.endswith(PDF_EXTENSION):
+                blobs.append((entry.name, stat.st_size, stat.st_mtime))
+    return blobs, removed
+
+
+class LocalBlobBackend:
+    """Blobs as files under a local directory, served by the API node itself."""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(key))
+
+    async def write(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(write_atomic, self._path(key), data)
+
+    async def read(self, key: str) -> bytes:
+        def _read() -> bytes:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        return await asyncio.to_thread(_read)
+
+    async def size(self, key: str) -> Optional[int]:
+        try:
+            return (await asyncio.to_thread(os.stat, self._path(key))).st_size
+        except FileNotFoundError:
+            return None
+
+    async def delete(self, key: str) -> Optional[int]:
+        """Remove a blob, returning its size, or None if it did not exist."""
+        path = self._path(key)
+        try:
+            size = (await asyncio.to_thread(os.stat, path)).st_size
+            await asyncio.to_thread(os.remove, path)
+            return size
+        except FileNotFoundError:
+            return None
+
+    async def scan(self, shard: str, tmp_max_age: int) -> Tuple[List[BlobInfo], int]:
+        return await asyncio.to_thread(_scan_local, self._path(shard), tmp_max_age)
+
+    async def disk_usage(self) -> Optional[Dict[str, int]]:
+        disk = await asyncio.to_thread(shutil.disk_usage, self.root)
+        return {"total": disk.total, "used": disk.used, "free": disk.free}
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        return path if os.path.isfile(path) else None
+
+    async def presigned_url(self, key: str, filename: str, method: str = "GET") -> Optional[str]:
+        return None
+
+    def location(self, key: str) -> str:
+        return self._path(key)
+
+
+class S3BlobBackend:
+    """Blobs in an S3-compatible bucket (AWS, MinIO, ...), shared by all API nodes.
+
+    Large objects are uploaded in parallel parts and downloads are handed off
+    to the bucket through presigned redirects. boto3 is blocking, so every
+    call runs on a thread.
+    """
+
+    name = "s3"
+
+    def __init__(self, prefix: Optional[str] = None, content_type: str = "application/pdf"):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket = settings.S3_BUCKET
+        self.prefix = settings.S3_PREFIX if prefix is None else prefix
+        self.content_type = content_type
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _head(self, key: str) -> Optional[Dict]:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._head, key) is not None
+
+    async def write(self, key: str, data: bytes) -> None:
+        # upload_fileobj switches to a parallel multipart upload above the threshold
+        await asyncio.to_thread(
+            self.client.upload_fileobj,
+            BytesIO(data),
+            self.bucket,
+            self._key(key),
+            ExtraArgs={"ContentType": self.content_type},
+            Config=self.transfer_config
+        )
+
+    async def read(self, key: str) -> bytes:
+        def _read() -> bytes:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+        return await asyncio.to_thread(_read)
+
+    async def size(self, key: str) -> Optional[int]:
+        head = await asyncio.to_thread(self._head, key)
+        return head["ContentLength"] if head else None
+
+    async def delete(self, key: str) -> Optional[int]:
+        size = await self.size(key)
+        if size is None:
+            return None
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self._key(key))
+        return size
+
+    def _scan(self, shard: str, tmp_max_age: int) -> Tuple[List[BlobInfo], int]:
+        prefix = self._key(f"{shard}/")
+        blobs = []
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                name = obj["Key"].rsplit("/", 1)[-1]
+                if name.endswith(PDF_EXTENSION):
+                    blobs.append((name, obj["Size"], obj["LastModified"].timestamp()))
+
+        # Interrupted multipart uploads are the bucket's equivalent of temp files
+        aborted = 0
+        cutoff = time.time() - tmp_max_age
+        for page in self.client.get_paginator("list_multipart_uploads").paginate(Bucket=self.bucket, Prefix=prefix):
+            for upload in page.get("Uploads", []):
+                if upload["Initiated"].timestamp() < cutoff:
+                    self.client.abort_multipart_upload(
+                        Bucket=self.bucket, Key=upload["Key"], UploadId=upload["UploadId"]
+                    )
+                    aborted += 1
+        return blobs, aborted
+
+    async def scan(self, shard: str, tmp_max_age: int) -> Tuple[List[BlobInfo], int]:
+        return await asyncio.to_thread(self._scan, shard, tmp_max_age)
+
+    async def disk_usage(self) -> Optional[Dict[str, int]]:
+        return None
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    async def presigned_url(self, key: str, filename: str, method: str = "GET") -> Optional[str]:
+        # The method is part of the signature, so HEAD needs its own URL
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if method == "GET":
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+            params["ResponseContentType"] = "application/pdf"
+        return await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "head_object" if method == "HEAD" else "get_object",
+            Params=params,
+            ExpiresIn=settings.S3_PRESIGN_EXPIRY
+        )
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+
+class PDFStorage:
+    """Content-addressed PDF blobs, sharded two levels deep by hash prefix.
+
+    Identical PDFs share one blob. A Redis hash counts the GeneratedContent
+    rows referencing each blob so it can be removed when the last one goes.
+    Ids from before content addressing (flat ``uuid.pdf`` files) still resolve.
+    Blobs live on local disk or in an S3-compatible bucket (PDF_STORAGE_BACKEND).
+    """
+
+    refs_key = "pdf:refs"
+    tombstone_prefix = "pdf:deleting"
+    # "<shard>:bytes" and "<shard>:blobs" per first-level shard
+    shards_key = "pdf:shards"
+    # Blobs included in the shard usage
+    counted_key = "pdf:counted"
+
+    def __init__(self):
+        if settings.PDF_STORAGE_BACKEND == "s3":
+            self.backend = S3BlobBackend()
+        else:
+            self.backend = LocalBlobBackend(settings.PDF_STORAGE_PATH)
+        self.redis = cache_service.redis
+        self._take_ref = self.redis.register_script(TAKE_REF_SCRIPT)
+        self._release_ref = self.redis.register_script(RELEASE_SCRIPT)
+        self._clear_tombstone = self.redis.register_script(CLEAR_TOMBSTONE_SCRIPT)
+        self._count_blob_script = self.redis.register_script(COUNT_BLOB_SCRIPT)
+        logger.info(f"PDF Storage initialized ({self.backend.name} backend)")
+
+    def content_hash(self, file_id: str) -> Optional[str]:
+        """The SHA-256 a file id was derived from, if the id is content-addressed."""
+        stem = file_id[:-len(PDF_EXTENSION)] if file_id.endswith(PDF_EXTENSION) else file_id
+        if CONTENT_ADDRESS_PATTERN.fullmatch(stem):
+            return stem
+        return None
+
+    def key_for(self, file_id: str) -> str:
+        """Resolve a file id to its key within the backend."""
+        if os.path.basename(file_id) != file_id or not file_id.endswith(PDF_EXTENSION):
+            raise ValueError("Invalid file id")
+        digest = self.content_hash(file_id)
+        if digest is None:
+            # Legacy flat layout
+            return file_id
+        return f"{digest[:2]}/{digest[2:4]}/{file_id}"
+
+    def location(self, file_id: str) -> str:
+        """Where a blob is stored: a path, or an ``s3://`` URL."""
+        return self.backend.location(self.key_for(file_id))
+
+    def local_path(self, file_id: str) -> Optional[str]:
+        """The file to serve directly, when the blob is on this node's disk."""
+        return self.backend.local_path(self.key_for(file_id))
+
+    async def presigned_url(self, file_id: str, method: str = "GET") -> Optional[str]:
+        """A time-limited URL for fetching the blob straight from remote storage."""
+        return await self.backend.presigned_url(self.key_for(file_id), file_id, method)
+
+    async def size(self, file_id: str) -> Optional[int]:
+        return await self.backend.size(self.key_for(file_id))
+
+    async def scan(self, shard: str, tmp_max_age: int) -> Tuple[List[BlobInfo], int]:
+        """List the blobs in a first-level shard and clear its stale partial writes."""
+        return await self.backend.scan(shard, tmp_max_age)
+
+    async def disk_usage(self) -> Optional[Dict[str, int]]:
+        """Disk totals for local storage; None for remote backends."""
+        return await self.backend.disk_usage()
+
+    async def _count_blob(self, file_id: str, size: int, blobs: int) -> None:
+        await self._count_blob_script(
+            keys=[self.counted_key, self.shards_key],
+            args=[file_id, file_id[:2], size, blobs]
+        )
+
+    async def set_shard_usage(self, shard: str, size: int, blobs: int) -> None:
+        """Overwrite a shard's usage with a freshly measured value."""
+        await self.redis.hset(self.shards_key, mapping={f"{shard}:bytes": size, f"{shard}:blobs": blobs})
+
+    async def usage(self) -> Dict[str, int]:
+        """Bytes and blob count across all content-addressed shards."""
+        totals = {"bytes": 0, "blobs": 0}
+        for field, value in (await self.redis.hgetall(self.shards_key)).items():
+            totals[field.rsplit(":", 1)[1]] += int(value)
+        return totals
+
+    def _tombstone_key(self, file_id: str) -> str:
+        return f"{self.tombstone_prefix}:{file_id}"
+
+    async def _wait_for_deletion(self, file_id: str) -> None:
+        """Wait until a deletion decided before our reference has finished."""
+        deadline = time.monotonic() + DELETE_TOMBSTONE_TTL
+        while await self.redis.exists(self._tombstone_key(file_id)) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def file_id_for(self, data: bytes) -> str:
+        """The content-addressed file id a PDF is stored under."""
+        digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+        return f"{digest}{PDF_EXTENSION}"
+
+    async def put(self, data: bytes, file_id: Optional[str] = None) -> str:
+        """Store a PDF and take a reference on it, returning its file id."""
+        file_id = file_id or await self.file_id_for(data)
+        key = self.key_for(file_id)
+
+        # Once the reference is taken no new deletion can start. One that
+        # started earlier left a tombstone; the blob is written again after it.
+        deleting = await self._take_ref(keys=[self.refs_key, self._tombstone_key(file_id)], args=[file_id])
+        try:
+            if int(deleting):
+                await self._wait_for_deletion(file_id)
+            if await self.backend.exists(key):
+                logger.info(f"Reusing stored PDF {file_id}")
+            else:
+                await self.backend.write(key, data)
+                await self._count_blob(file_id, len(data), 1)
+                logger.info(f"Stored PDF {file_id} ({len(data)} bytes)")
+        except Exception:
+            # Nothing will refer to the blob, so the reference must not outlive this call
+            await self.release(file_id)
+            raise
+        return file_id
+
+    async def release(self, file_id: str, delta: int = -1) -> bool:
+        """Change a blob's reference count by ``delta`` (one release by default),
+        deleting the blob when none remain. Returns True if deleted."""
+        if self.content_hash(file_id) is None:
+            # Legacy files were never shared
+            return await self.delete_blob(file_id)
+
+        token = uuid.uuid4().hex
+        tombstone = self._tombstone_key(file_id)
+        unreferenced = await self._release_ref(
+            keys=[self.refs_key, tombstone],
+            args=[file_id, delta, token, DELETE_TOMBSTONE_TTL]
+        )
+        if not int(unreferenced):
+            return False
+        try:
+            return await self.delete_blob(file_id)
+        finally:
+            await self._clear_tombstone(keys=[tombstone], args=[token])
+
+    async def delete_blob(self, file_id: str) -> bool:
+        """Remove a blob from storage and from the shard usage. Returns True if it existed.
+
+        Callers other than ``release`` must know the blob has no references.
+        """
+        size = await self.backend.delete(self.key_for(file_id))
+        if size is None:
+            return False
+        if self.content_hash(file_id) is not None:
+            await self._count_blob(file_id, -size, -1)
+        logger.info(f"Deleted unreferenced PDF {file_id}")
+        return True
+
+    async def rebuild_refcounts(self) -> int:
+        """Recount references from GeneratedContent rows. Returns the number of blobs."""
+        try:
+            async with db.get_client() as client:
+                groups = await client.generatedcontent.group_by(
+                    by=["filename"],
+                    where={"type": "PDF", "filename": {"not": None}},
+                    count=True
+                )
+            counts = {
+                group["filename"]: group["_count"]["_all"]
+                for group in groups
+                if self.content_hash(group["filename"] or "")
+            }
+            pipe = self.redis.pipeline()
+            pipe.delete(self.refs_key)
+            if counts:
+                pipe.hset(self.refs_key, mapping=counts)
+            await pipe.execute()
+            logger.info(f"Rebuilt PDF reference counts for {len(counts)} blobs")
+            return len(counts)
+        except Exception as e:
+            logger.error(f"Failed to rebuild PDF reference counts: {str(e)}")
+            raise
+
+
+pdf_storage = PDFStorage()
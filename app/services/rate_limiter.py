@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from jose import jwt, JWTError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..core.config import settings
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# GCRA: the key holds the theoretical arrival time (TAT) in ms. A request of
+# cost c moves it c emission intervals forward and is allowed while the TAT
+# stays within one window of now. Time comes from Redis so API nodes' clocks
+# do not matter.
+GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + emission * cost
+if new_tat - now > window then
+    return {0, math.floor((window - (tat - now)) / emission), new_tat - window - now, tat - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, math.floor((window - (new_tat - now)) / emission), 0, new_tat - now}
+"""
+
+# Paths never limited, relative to the app root
+EXEMPT_PATHS = ("/health", "/docs", "/redoc", "/openapi.json")
+
+
+class RateLimitResult:
+    __slots__ = ("allowed", "remaining", "retry_after", "reset")
+
+    def __init__(self, allowed: bool, remaining: int, retry_after: float, reset: float):
+        self.allowed = allowed
+        self.remaining = max(0, remaining)
+        self.retry_after = retry_after
+        self.reset = reset
+
+
+class RateLimiter:
+    """Per-client request budget, enforced with GCRA.
+
+    Each client may spend ``RATE_LIMIT_REQUESTS`` cost units per
+    ``RATE_LIMIT_WINDOW`` seconds, refilled continuously. A check is one
+    atomic script call. If Redis errors or takes longer than
+    ``RATE_LIMIT_REDIS_TIMEOUT``, this process limits on its own for
+    ``RATE_LIMIT_FALLBACK_PERIOD`` seconds. Its local budget is the same per
+    client, so across several nodes the limit is looser but still bounded.
+    """
+
+    prefix = "ratelimit"
+
+    def __init__(self):
+        self.redis = cache_service.redis
+        self._script = self.redis.register_script(GCRA_SCRIPT)
+        self._local: "OrderedDict[str, float]" = OrderedDict()
+        self._fallback_until = 0.0
+        self._stats = {"allowed": 0, "limited": 0, "fallbacks": 0}
+        # Longest prefixes first, so /pdf/generate-story beats /pdf/
+        self._costs: List[Tuple[str, int]] = sorted(
+            settings.RATE_LIMIT_COSTS.items(), key=lambda item: len(item[0]), reverse=True
+        )
+        logger.info("Rate Limiter initialized")
+
+    @property
+    def emission_ms(self) -> float:
+        return settings.RATE_LIMIT_WINDOW * 1000 / settings.RATE_LIMIT_REQUESTS
+
+    def cost(self, path: str) -> int:
+        """Cost units of a request; ``RATE_LIMIT_COSTS`` is keyed by path prefix under the API prefix."""
+        if path.startswith(settings.API_PREFIX):
+            path = path[len(settings.API_PREFIX):]
+        for prefix, cost in self._costs:
+            if path.startswith(prefix):
+                return cost
+        return 1
+
+    def _check_local(self, key: str, cost: int) -> RateLimitResult:
+        emission = self.emission_ms
+        window = settings.RATE_LIMIT_WINDOW * 1000
+        now = time.time() * 1000
+        tat = max(self._local.get(key, now), now)
+        new_tat = tat + emission * cost
+        if new_tat - now > window:
+            return RateLimitResult(False, math.floor((window - (tat - now)) / emission), new_tat - window - now, tat - now)
+        self._local[key] = new_tat
+        self._local.move_to_end(key)
+        while len(self._local) > settings.RATE_LIMIT_LOCAL_SIZE:
+            self._local.popitem(last=False)
+        return RateLimitResult(True, math.floor((window - (new_tat - now)) / emission), 0, new_tat - now)
+
+    async def check(self, client_id: str, cost: int) -> RateLimitResult:
+        """Spend ``cost`` units of a client's budget, if it has them."""
+        key = f"{self.prefix}:{client_id}"
+        if time.monotonic() >= self._fallback_until:
+            try:
+                allowed, remaining, retry_after, reset = await asyncio.wait_for(
+                    self._script(keys=[key], args=[self.emission_ms, settings.RATE_LIMIT_WINDOW * 1000, cost]),
+                    timeout=settings.RATE_LIMIT_REDIS_TIMEOUT
+                )
+                result = RateLimitResult(bool(int(allowed)), int(remaining), int(retry_after), int(reset))
+            except Exception as e:
+                logger.warning(f"Rate limiting locally for {settings.RATE_LIMIT_FALLBACK_PERIOD}s: {e!r}")
+                self._stats["fallbacks"] += 1
+                self._fallback_until = time.monotonic() + settings.RATE_LIMIT_FALLBACK_PERIOD
+                result = self._check_local(key, cost)
+        else:
+            result = self._check_local(key, cost)
+        self._stats["allowed" if result.allowed else "limited"] += 1
+        return result
+
+    def metrics(self) -> Dict:
+        return {"local_fallback": time.monotonic() < self._fallback_until, **self._stats}
+
+
+rate_limiter = RateLimiter()
+
+
+def _client_id(scope: Scope) -> str:
+    """The user of a valid bearer token, otherwise the client address."""
+    authorization = Headers(scope=scope).get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            payload = jwt.decode(
+                authorization[7:],
+                key=settings.JWT_SECRET,
+                algorithms=[settings.JWT_ALGORITHM]
+            )
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """Reject over-budget requests with 429 before they reach a route, and
+    report the budget in ``X-RateLimit-*`` headers."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not settings.RATE_LIMIT_ENABLED
+            or scope["method"] == "OPTIONS"
+            or scope["path"] in EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        cost = rate_limiter.cost(scope["path"])
+        result = await rate_limiter.check(_client_id(scope), cost)
+        headers = {
+            "X-RateLimit-Limit": str(settings.RATE_LIMIT_REQUESTS),
+            "X-RateLimit-Remaining": str(result.remaining),
+            "X-RateLimit-Reset": str(math.ceil(result.reset / 1000))
+        }
+        if not result.allowed:
+            headers["Retry-After"] = str(math.ceil(result.retry_after / 1000))
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded. Please try again later."},
+                headers=headers
+            )
+            await response(scope, receive, send)
+            return
+
+        raw_headers = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + raw_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import secrets
+from typing import Optional, Tuple
+from ..core.config import settings
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Checks the presented secret against the family's current one and rotates it,
+# all in one round trip. A stale secret means the token was used twice, so the
+# whole family is revoked.
+ROTATE_SCRIPT = """
+local user = redis.call('HGET', KEYS[1], 'user')
+if not user then
+    return {0, ''}
+end
+if redis.call('HGET', KEYS[1], 'current') ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return {-1, user}
+end
+redis.call('HSET', KEYS[1], 'current', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, user}
+"""
+
+
+class RefreshTokenReused(ValueError):
+    """Raised when an already-rotated refresh token is presented."""
+
+
+class RefreshTokenService:
+    """Rotating refresh tokens, grouped into families.
+
+    A token is ``<family>.<secret>``. Redis keeps one small hash per family
+    (``refresh:{family}``) holding the user id and a digest of the only
+    secret currently valid. Each refresh replaces the secret; presenting an
+    old one revokes the family, since the token must have been copied.
+    Families idle for ``REFRESH_TOKEN_EXPIRE_DAYS`` expire.
+    """
+
+    prefix = "refresh"
+    user_prefix = "refresh:user:"
+
+    def __init__(self):
+        self.redis = cache_service.redis
+        self._rotate = self.redis.register_script(ROTATE_SCRIPT)
+        logger.info("Refresh Token Service initialized")
+
+    @property
+    def ttl(self) -> int:
+        return settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+
+    def _key(self, family: str) -> str:
+        return f"{self.prefix}:{family}"
+
+    @staticmethod
+    def _digest(secret: str) -> str:
+        return hashlib.sha256(secret.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def _split(token: str) -> Tuple[str, str]:
+        family, _, secret = token.partition(".")
+        if not family or not secret:
+            raise ValueError("Invalid refresh token")
+        return family, secret
+
+    async def issue(self, user_id: str) -> str:
+        """Start a new family for a login and return its first token."""
+        family = secrets.token_urlsafe(12)
+        secret = secrets.token_urlsafe(32)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(self._key(family), mapping={"user": user_id, "current": self._digest(secret)})
+        pipe.expire(self._key(family), self.ttl)
+        # Lets a password change or deletion revoke every session of the user.
+        # The index has no TTL, since rotation keeps families alive past any
+        # login-time expiry; ids of expired families are pruned at each login.
+        pipe.sadd(f"{self.user_prefix}{user_id}", family)
+        await pipe.execute()
+        await self._prune(user_id)
+        return f"{family}.{secret}"
+
+    async def _prune(self, user_id: str) -> None:
+        """Drop ids of expired or revoked families from the user's index."""
+        index = f"{self.user_prefix}{user_id}"
+        families = list(await self.redis.smembers(index))
+        if not families:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for family in families:
+            pipe.exists(self._key(family))
+        live = await pipe.execute()
+        dead = [family for family, exists in zip(families, live) if not exists]
+        if dead:
+            await self.redis.srem(index, *dead)
+
+    async def rotate(self, token: str) -> Tuple[str, str]:
+        """Exchange a refresh token for the next one in its family.
+
+        Returns the user id and the new token. Raises ValueError if the token
+        is unknown or expired, and RefreshTokenReused if it was already used.
+        """
+        family, secret = self._split(token)
+        new_secret = secrets.token_urlsafe(32)
+        status, user_id = await self._rotate(
+            keys=[self._key(family)],
+            args=[self._digest(secret), self._digest(new_secret), self.ttl]
+        )
+        if int(status) == -1:
+            logger.warning(f"Refresh token reuse for user {user_id}; revoked its family")
+            raise RefreshTokenReused("Refresh token has already been used")
+        if int(status) == 0:
+            raise ValueError("Invalid or expired refresh token")
+        return user_id, f"{family}.{new_secret}"
+
+    async def revoke(self, token: str, user_id: Optional[str] = None) -> None:
+        """Revoke the family of a token, e.g. at logout."""
+        family, _ = self._split(token)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(self._key(family))
+        if user_id:
+            pipe.srem(f"{self.user_prefix}{user_id}", family)
+        await pipe.execute()
+
+    async def revoke_user(self, user_id: str) -> None:
+        """Revoke every family of a user."""
+        families = await self.redis.smembers(f"{self.user_prefix}{user_id}")
+        keys = [self._key(family) for family in families] + [f"{self.user_prefix}{user_id}"]
+        await self.redis.delete(*keys)
+
+
+refresh_token_service = RefreshTokenService()
@@ -0,0 +1,191 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import time
+import uuid
+import zlib
+from typing import Dict, Iterable, Optional
+from ..core.config import settings
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Revocations logged this close to a snapshot's build time are merged again on load
+SNAPSHOT_MARGIN = 5
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for ``capacity`` items at ``error_rate``."""
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytes] = None):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationService:
+    """Revoked access tokens, by ``jti``.
+
+    Redis holds the authoritative ``revoked:{jti}`` keys, expiring with the
+    tokens, and a log of recent revocations. Each process keeps a Bloom
+    filter of revoked ids, fed by pub/sub and rebuilt from a shared snapshot
+    every ``REVOCATION_SNAPSHOT_INTERVAL`` seconds, so a token is only looked
+    up in Redis when the filter says it may be revoked. Until the filter is
+    loaded, and while the subscription is down, every check goes to Redis.
+    """
+
+    key_prefix = "revoked"
+    log_key = "revoked:log"
+    snapshot_key = "revoked:bloom"
+    lock_key = "revoked:bloom:lock"
+    channel = "revoked:new"
+
+    def __init__(self):
+        self.redis = cache_service.redis
+        self._filter = self._new_filter()
+        self._ready = False
+        # Ids received while a reload is reading Redis, added to the new filter
+        self._pending: Optional[set] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._stats = {"filter_skips": 0, "redis_checks": 0, "false_positives": 0, "revoked": 0}
+        logger.info("Revocation Service initialized")
+
+    @staticmethod
+    def _new_filter(bits: Optional[bytes] = None) -> BloomFilter:
+        return BloomFilter(settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE, bits)
+
+    def _add(self, jti: str) -> None:
+        self._filter.add(jti)
+        if self._pending is not None:
+            self._pending.add(jti)
+
+    def _key(self, jti: str) -> str:
+        return f"{self.key_prefix}:{jti}"
+
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        """Revoke a token until it would have expired anyway."""
+        ttl = int(expires_at - time.time())
+        if ttl <= 0:
+            return
+        self._add(jti)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(self._key(jti), "1", ex=ttl)
+        pipe.zadd(self.log_key, {jti: time.time()})
+        pipe.publish(self.channel, jti)
+        await pipe.execute()
+
+    async def is_revoked(self, jti: str) -> bool:
+        if self._ready and jti not in self._filter:
+            self._stats["filter_skips"] += 1
+            return False
+        self._stats["redis_checks"] += 1
+        revoked = bool(await self.redis.exists(self._key(jti)))
+        if revoked:
+            self._stats["revoked"] += 1
+        elif self._ready:
+            self._stats["false_positives"] += 1
+        return revoked
+
+    async def _build_snapshot(self) -> None:
+        """Rebuild the shared filter from the log, dropping revocations of expired tokens."""
+        now = time.time()
+        await self.redis.zremrangebyscore(self.log_key, "-inf", now - settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        bloom = self._new_filter()
+        for jti in await self.redis.zrange(self.log_key, 0, -1):
+            bloom.add(jti)
+        await self.redis.set(self.snapshot_key, json.dumps({
+            "built_at": now,
+            "capacity": settings.REVOCATION_BLOOM_CAPACITY,
+            "error_rate": settings.REVOCATION_BLOOM_ERROR_RATE,
+            "bits": base64.b64encode(zlib.compress(bytes(bloom.bits))).decode()
+        }))
+
+    async def _load(self) -> None:
+        """Replace the local filter with the snapshot plus anything revoked since it was built."""
+        self._pending = set()
+        snapshot = await self.redis.get(self.snapshot_key)
+        data = json.loads(snapshot) if snapshot else None
+        if not data or data["capacity"] != settings.REVOCATION_BLOOM_CAPACITY or data["error_rate"] != settings.REVOCATION_BLOOM_ERROR_RATE:
+            bloom, since = self._new_filter(), "-inf"
+        else:
+            bloom = self._new_filter(zlib.decompress(base64.b64decode(data["bits"])))
+            since = data["built_at"] - SNAPSHOT_MARGIN
+        for jti in await self.redis.zrangebyscore(self.log_key, since, "+inf"):
+            bloom.add(jti)
+        for jti in self._pending:
+            bloom.add(jti)
+        self._filter = bloom
+        self._pending = None
+
+    async def refresh(self) -> None:
+        """Rebuild the shared snapshot if no other process is, then reload from it."""
+        token = uuid.uuid4().hex
+        if await self.redis.set(self.lock_key, token, nx=True, ex=settings.REVOCATION_SNAPSHOT_INTERVAL):
+            await self._build_snapshot()
+        await self._load()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                # Revocations published from here on arrive as messages
+                await self._load()
+                self._ready = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._add(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Revocation listener error: {str(e)}")
+                # Revocations may have been missed while disconnected
+                self._ready = False
+                await asyncio.sleep(1)
+
+    async def _run_refresher(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REVOCATION_SNAPSHOT_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Revocation snapshot refresh failed: {str(e)}")
+
+    def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._run_refresher())
+
+    async def stop(self) -> None:
+        for task in (self._listener, self._refresher):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._listener = None
+        self._refresher = None
+        self._ready = False
+
+    def metrics(self) -> Dict:
+        return {"ready": self._ready, "filter_bytes": len(self._filter.bits), **self._stats}
+
+
+revocation_service = RevocationService()
@@ -0,0 +1,484 @@
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from prisma.partials import GeneratedContentRef
+from ..core.config import settings
+from ..core.database import db
+from .cache_service import cache_service
+from .content_bodies import content_bodies
+from .pdf_storage import write_atomic
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+USER_ID_PATTERN = re.compile(r"[0-9a-fA-F]{24}")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+MAX_TERM_LENGTH = 40
+MAX_PREFIX_EXPANSIONS = 64
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TYPE_CODES = {"CHAT": 0, "PDF": 1, "VOICE": 2, "FILE": 3}
+
+# Leads every saved shard; the digit is bumped when the layout changes
+SHARD_MAGIC = b"IDX2"
+
+# Rows fetched per query when a shard is reconciled with the database
+CATCH_UP_BATCH = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, without stopwords or very long tokens."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS and len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class UserIndex:
+    """One user's inverted index.
+
+    Documents are numbered in insertion order. Each term's postings are two
+    parallel ``array('I')`` columns of document numbers and term frequencies,
+    which keeps a shard small in memory and on disk. Deletes leave tombstones
+    until enough pile up to make compaction worthwhile.
+    """
+
+    def __init__(self):
+        self.doc_ids: List[str] = []
+        self.doc_numbers: Dict[str, int] = {}
+        self.doc_lengths = array("I")
+        self.doc_types = array("B")
+        self.deleted = bytearray()
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.total_length = 0
+        self.dirty = False
+        self._sorted_terms: Optional[List[str]] = None
+
+    @property
+    def live(self) -> int:
+        return len(self.doc_numbers)
+
+    def add(self, doc_id: str, content_type: str, text: str) -> bool:
+        """Index a document. Returns False if it was already indexed."""
+        if doc_id in self.doc_numbers:
+            return False
+
+        tokens = tokenize(text)
+        number = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_numbers[doc_id] = number
+        self.doc_lengths.append(len(tokens))
+        self.doc_types.append(TYPE_CODES.get(content_type, 255))
+        self.deleted.append(0)
+        self.total_length += len(tokens)
+
+        for term, frequency in Counter(tokens).items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("I"), array("I"))
+                self._sorted_terms = None
+            entry[0].append(number)
+            entry[1].append(frequency)
+        self.dirty = True
+        return True
+
+    def remove(self, doc_id: str) -> bool:
+        """Tombstone a document. Returns False if it was not indexed."""
+        number = self.doc_numbers.pop(doc_id, None)
+        if number is None:
+            return False
+        self.deleted[number] = 1
+        self.total_length -= self.doc_lengths[number]
+        self.dirty = True
+        if len(self.doc_ids) - self.live > max(64, self.live // 4):
+            self.compact()
+        return True
+
+    def compact(self) -> None:
+        """Drop tombstoned documents and renumber the rest."""
+        renumber = array("i", [-1]) * len(self.doc_ids)
+        doc_ids, doc_lengths, doc_types = [], array("I"), array("B")
+        for number, doc_id in enumerate(self.doc_ids):
+            if not self.deleted[number]:
+                renumber[number] = len(doc_ids)
+                doc_ids.append(doc_id)
+                doc_lengths.append(self.doc_lengths[number])
+                doc_types.append(self.doc_types[number])
+
+        postings = {}
+        for term, (numbers, frequencies) in self.postings.items():
+            kept_numbers, kept_frequencies = array("I"), array("I")
+            for number, frequency in zip(numbers, frequencies):
+                if renumber[number] >= 0:
+                    kept_numbers.append(renumber[number])
+                    kept_frequencies.append(frequency)
+            if kept_numbers:
+                postings[term] = (kept_numbers, kept_frequencies)
+
+        self.doc_ids = doc_ids
+        self.doc_numbers = {doc_id: number for number, doc_id in enumerate(doc_ids)}
+        self.doc_lengths = doc_lengths
+        self.doc_types = doc_types
+        self.deleted = bytearray(len(doc_ids))
+        self.postings = postings
+        self._sorted_terms = None
+        self.dirty = True
+
+    def _expand(self, prefix: str) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        terms = []
+        i = bisect_left(self._sorted_terms, prefix)
+        while i < len(self._sorted_terms) and self._sorted_terms[i].startswith(prefix):
+            terms.append(self._sorted_terms[i])
+            if len(terms) >= MAX_PREFIX_EXPANSIONS:
+                break
+            i += 1
+        return terms
+
+    def search(self, query: str, content_type: Optional[str] = None, limit: int = 20) -> List[Tuple[str, float]]:
+        """Rank documents against a query with BM25. Words ending in ``*`` match as prefixes."""
+        if not self.live:
+            return []
+
+        terms = set()
+        for word in query.split():
+            tokens = tokenize(word)
+            if word.endswith("*") and tokens:
+                terms.update(tokens[:-1])
+                terms.update(self._expand(tokens[-1]))
+            else:
+                terms.update(tokens)
+
+        type_code = TYPE_CODES.get(content_type) if content_type else None
+        average_length = self.total_length / self.live or 1.0
+        scores: Dict[int, float] = {}
+        for term in terms:
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            numbers, frequencies = entry
+            # Postings may still hold tombstones, so this can overcount slightly
+            df = min(len(numbers), self.live)
+            idf = math.log(1 + (self.live - df + 0.5) / (df + 0.5))
+            for number, frequency in zip(numbers, frequencies):
+                if self.deleted[number] or (type_code is not None and self.doc_types[number] != type_code):
+                    continue
+                norm = K1 * (1 - B + B * self.doc_lengths[number] / average_length)
+                scores[number] = scores.get(number, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[number], round(score, 4)) for number, score in best]
+
+    def to_bytes(self) -> bytes:
+        """Serialize as a JSON header followed by the raw array columns.
+
+        Shards live in a shared directory, so nothing in the format is executed on load.
+        """
+        terms = list(self.postings)
+        numbers, frequencies = array("I"), array("I")
+        for term in terms:
+            numbers.extend(self.postings[term][0])
+            frequencies.extend(self.postings[term][1])
+        header = json.dumps({
+            "doc_ids": self.doc_ids,
+            "terms": terms,
+            "counts": [len(self.postings[term][0]) for term in terms]
+        }, separators=(",", ":")).encode()
+        return b"".join([
+            SHARD_MAGIC,
+            struct.pack("<I", len(header)),
+            header,
+            _little_endian(self.doc_lengths),
+            self.doc_types.tobytes(),
+            bytes(self.deleted),
+            _little_endian(numbers),
+            _little_endian(frequencies)
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "UserIndex":
+        if data[:len(SHARD_MAGIC)] != SHARD_MAGIC:
+            raise ValueError("Not a search index shard")
+        view = memoryview(data)
+        offset = len(SHARD_MAGIC)
+        (header_length,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        header = json.loads(bytes(view[offset:offset + header_length]))
+        offset += header_length
+
+        def column(typecode: str, count: int) -> array:
+            nonlocal offset
+            values = array(typecode)
+            size = count * values.itemsize
+            if offset + size > len(data):
+                raise ValueError("Truncated search index shard")
+            values.frombytes(view[offset:offset + size])
+            offset += size
+            if sys.byteorder == "big":
+                values.byteswap()
+            return values
+
+        index = cls()
+        index.doc_ids = header["doc_ids"]
+        documents = len(index.doc_ids)
+        index.doc_lengths = column("I", documents)
+        index.doc_types = column("B", documents)
+        index.deleted = bytearray(column("B", documents))
+        total = sum(header["counts"])
+        numbers = column("I", total)
+        frequencies = column("I", total)
+        if offset != len(data):
+            raise ValueError("Malformed search index shard")
+
+        start = 0
+        for term, count in zip(header["terms"], header["counts"]):
+            index.postings[term] = (numbers[start:start + count], frequencies[start:start + count])
+            start += count
+        index.doc_numbers = {
+            doc_id: number for number, doc_id in enumerate(index.doc_ids) if not index.deleted[number]
+        }
+        index.total_length = sum(
+            length for number, length in enumerate(index.doc_lengths) if not index.deleted[number]
+        )
+        return index
+
+
+class SearchService:
+    """Per-user full-text indexes over generated content.
+
+    Shards are loaded on first search, kept in an LRU, and saved to
+    ``SEARCH_INDEX_PATH``. Loading reconciles a saved shard with the
+    database, so rows written or deleted while it was not loaded are picked
+    up however late. Once rows are in the database their ids are broadcast
+    over Redis pub/sub, and every API process with the owner's shard loaded
+    reads and indexes them.
+    """
+
+    channel = "search:updates"
+
+    def __init__(self):
+        self.root = settings.SEARCH_INDEX_PATH
+        self.redis = cache_service.redis
+        self._shards: "OrderedDict[str, UserIndex]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Updates received while a user's shard is loading, applied once it is
+        self._pending: Dict[str, List[Tuple[str, str]]] = {}
+        self._tasks: List[asyncio.Task] = []
+        os.makedirs(self.root, exist_ok=True)
+        logger.info("Search Service initialized")
+
+    def _path(self, user_id: str) -> str:
+        if not USER_ID_PATTERN.fullmatch(user_id):
+            raise ValueError("Invalid user id")
+        return os.path.join(self.root, f"{user_id}.idx")
+
+    async def _save(self, user_id: str, shard: UserIndex) -> None:
+        shard.dirty = False
+        try:
+            await asyncio.to_thread(write_atomic, self._path(user_id), shard.to_bytes())
+        except Exception:
+            shard.dirty = True
+            raise
+
+    async def _row_text(self, row) -> str:
+        text = row.content
+        if row.bodyRef and "content" in row.bodyRef["fields"]:
+            text = (await content_bodies.load(row.bodyRef))["content"]
+        return f"{row.title}\n{text}"
+
+    async def _load(self, user_id: str) -> UserIndex:
+        path = self._path(user_id)
+        try:
+            with open(path, "rb") as f:
+                shard = UserIndex.from_bytes(await asyncio.to_thread(f.read))
+        except FileNotFoundError:
+            shard = UserIndex()
+        except Exception as e:
+            logger.error(f"Rebuilding unreadable search index {path}: {str(e)}")
+            shard = UserIndex()
+
+        # Reconcile with the database by id: write-behind rows can land long
+        # after they were created, and deletes of unloaded shards were not applied
+        stored = set()
+        async with db.get_client() as client:
+            cursor = None
+            while True:
+                rows = await GeneratedContentRef.prisma(client).find_many(
+                    where={"userId": user_id},
+                    order={"id": "asc"},
+                    take=CATCH_UP_BATCH,
+                    skip=1 if cursor else None,
+                    cursor={"id": cursor} if cursor else None
+                )
+                stored.update(row.id for row in rows)
+                if len(rows) < CATCH_UP_BATCH:
+                    break
+                cursor = rows[-1].id
+
+            removed = [doc_id for doc_id in shard.doc_numbers if doc_id not in stored]
+            for doc_id in removed:
+                shard.remove(doc_id)
+
+            missing = sorted(stored.difference(shard.doc_numbers))
+            for start in range(0, len(missing), CATCH_UP_BATCH):
+                rows = await client.generatedcontent.find_many(
+                    where={"id": {"in": missing[start:start + CATCH_UP_BATCH]}}
+                )
+                for row in rows:
+                    shard.add(row.id, row.type, await self._row_text(row))
+        if missing or removed:
+            logger.info(f"Indexed {len(missing)} and dropped {len(removed)} rows for user {user_id}")
+        return shard
+
+    async def _shard(self, user_id: str) -> UserIndex:
+        shard = self._shards.get(user_id)
+        if shard is not None:
+            self._shards.move_to_end(user_id)
+            return shard
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            shard = self._shards.get(user_id)
+            if shard is None:
+                self._pending[user_id] = []
+                try:
+                    shard = await self._load(user_id)
+                    self._shards[user_id] = shard
+                finally:
+                    updates = self._pending.pop(user_id)
+                for op, content_id in updates:
+                    await self._apply_safely(op, [(user_id, content_id)])
+                if shard.dirty:
+                    await self._save(user_id, shard)
+        self._locks.pop(user_id, None)
+
+        while len(self._shards) > settings.SEARCH_MAX_LOADED_SHARDS:
+            evicted_id, evicted = self._shards.popitem(last=False)
+            if evicted.dirty:
+                await self._save(evicted_id, evicted)
+        return shard
+
+    async def index(self, rows: Iterable[Tuple[str, str]]) -> None:
+        """Add ``(user_id, content_id)`` rows, already in the database, to their owners' indexes in every API process."""
+        items = [list(row) for row in rows]
+        if items:
+            await self.redis.publish(self.channel, json.dumps({"op": "add", "items": items}))
+
+    async def remove(self, user_id: str, content_id: str) -> None:
+        """Drop a row from its owner's index in every API process."""
+        await self.redis.publish(self.channel, json.dumps({"op": "remove", "items": [[user_id, content_id]]}))
+
+    async def _apply(self, op: str, items: List[Tuple[str, str]]) -> None:
+        # Shards that are not loaded reconcile with the database when they are
+        added: List[str] = []
+        for user_id, content_id in items:
+            pending = self._pending.get(user_id)
+            if pending is not None:
+                pending.append((op, content_id))
+                continue
+            shard = self._shards.get(user_id)
+            if shard is None:
+                continue
+            if op == "remove":
+                shard.remove(content_id)
+            else:
+                added.append(content_id)
+        if not added:
+            return
+
+        async with db.get_client() as client:
+            rows = await client.generatedcontent.find_many(where={"id": {"in": added}})
+        for row in rows:
+            # The shard may have been evicted while the rows were read
+            shard = self._shards.get(row.userId)
+            if shard is not None:
+                shard.add(row.id, row.type, await self._row_text(row))
+
+    async def _apply_safely(self, op: str, items: List[Tuple[str, str]]) -> None:
+        try:
+            await self._apply(op, items)
+        except Exception as e:
+            logger.error(f"Error applying search update: {str(e)}")
+            # Unloading the shards makes the next search reconcile them with the database
+            for user_id, _ in items:
+                self._shards.pop(user_id, None)
+
+    async def search(self, user_id: str, query: str, content_type: Optional[str] = None, limit: int = 20) -> List[Tuple[str, float]]:
+        """Best-matching content ids for a user's query, with their scores."""
+        try:
+            shard = await self._shard(user_id)
+            return shard.search(query, content_type, limit)
+        except Exception as e:
+            logger.error(f"Error searching content: {str(e)}")
+            raise
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        event = json.loads(message["data"])
+                        await self._apply_safely(event["op"], event["items"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Search update listener error: {str(e)}")
+                # Updates may have been missed while disconnected
+                self._shards.clear()
+                await asyncio.sleep(1)
+
+    async def save_dirty(self) -> None:
+        """Persist every loaded shard that changed since it was last saved."""
+        for user_id, shard in list(self._shards.items()):
+            if shard.dirty:
+                await self._save(user_id, shard)
+
+    async def _persist(self) -> None:
+        while True:
+            await asyncio.sleep(settings.SEARCH_SAVE_INTERVAL)
+            try:
+                await self.save_dirty()
+            except Exception as e:
+                logger.error(f"Error saving search indexes: {str(e)}")
+
+    def start(self) -> None:
+        """Follow index updates and save shards periodically in this process."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._persist())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.save_dirty()
+
+
+search_service = SearchService()
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Set, Tuple
+from ..core.config import settings
+from ..core.database import db
+from .cache_service import cache_service
+from .content_bodies import content_bodies
+from .pdf_storage import pdf_storage
+from .search_service import search_service
+
+logger = logging.getLogger(__name__)
+
+# First-level shard directories, swept one per pass
+SHARD_COUNT = 256
+
+# Forgets a recently stored file only if no store() has refreshed it since
+ZREM_IF_OLD_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) <= tonumber(ARGV[2]) then
+    return redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+class StorageQuotaExceeded(ValueError):
+    """Raised when a user or the node has no room for another PDF."""
+
+
+def _sweep_temp(root: str, max_age: int, limit: int) -> Tuple[int, int]:
+    """Remove up to ``limit`` temp files older than ``max_age``.
+
+    Returns the number removed and the bytes of temp files left in place.
+    """
+    removed = 0
+    remaining_bytes = 0
+    now = time.time()
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+                if removed < limit and now - stat.st_mtime > max_age:
+                    os.remove(path)
+                    removed += 1
+                else:
+                    remaining_bytes += stat.st_size
+            except FileNotFoundError:
+                continue
+    return removed, remaining_bytes
+
+
+class StorageManager:
+    """Quotas, retention and incremental garbage collection for stored files.
+
+    Each pass does a bounded amount of work: it reconciles a batch of recently
+    stored PDFs against the database, walks one of the 256 first-level shards,
+    and clears stale temp files. A Redis lock keeps passes on different nodes
+    from overlapping.
+    """
+
+    usage_key = "storage:usage"  # user id -> bytes of PDFs they reference
+    recent_key = "storage:recent"  # file id -> when it was last stored
+    cursor_key = "storage:gc:shard"
+    lock_key = "storage:gc:lock"
+
+    def __init__(self):
+        self.redis = cache_service.redis
+        self._zrem_if_old = self.redis.register_script(ZREM_IF_OLD_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "passes": 0,
+            "orphans_deleted": 0,
+            "temp_files_deleted": 0,
+            "expired_deleted": 0,
+            "temp_bytes": 0,
+            "last_pass": None
+        }
+        logger.info("Storage Manager initialized")
+
+    async def user_usage(self, user_id: str) -> int:
+        """Bytes of stored PDFs charged to a user."""
+        return max(int(await self.redis.hget(self.usage_key, user_id) or 0), 0)
+
+    async def check_quota(self, user_id: str) -> None:
+        """Raise StorageQuotaExceeded if a new PDF would not fit."""
+        if await self.user_usage(user_id) >= settings.PDF_USER_QUOTA_BYTES:
+            raise StorageQuotaExceeded("PDF storage quota exceeded")
+        if (await pdf_storage.usage())["bytes"] >= settings.PDF_STORAGE_MAX_BYTES:
+            raise StorageQuotaExceeded("PDF storage is full")
+        disk = await pdf_storage.disk_usage()
+        if disk is not None and disk["free"] < settings.STORAGE_MIN_FREE_BYTES:
+            raise StorageQuotaExceeded("Not enough free disk space")
+
+    async def store(self, user_id: str, data: bytes) -> str:
+        """Store a PDF for a user, charging it to their quota. Returns its file id."""
+        # Marked recent before the reference is taken, so a reconcile that can
+        # see the reference also sees that the file is within its grace period
+        file_id = await pdf_storage.file_id_for(data)
+        await self.redis.zadd(self.recent_key, {file_id: time.time()})
+        await pdf_storage.put(data, file_id)
+        await self.redis.hincrby(self.usage_key, user_id, len(data))
+        return file_id
+
+    async def release(self, user_id: str, file_id: str) -> None:
+        """Drop a user's reference to a PDF and refund its size."""
+        try:
+            size = await pdf_storage.size(file_id) or 0
+        except ValueError:
+            size = 0
+        await pdf_storage.release(file_id)
+        if size:
+            await self.redis.hincrby(self.usage_key, user_id, -size)
+
+    async def _pending_filenames(self) -> Set[str]:
+        # Imported here: content_service depends on this module
+        from .content_service import content_service
+        return await content_service.pending_filenames()
+
+    async def _reconcile(self, client, file_id: str, pending: Set[str]) -> Optional[bool]:
+        """Correct a blob's reference count from the database, deleting it if unreferenced.
+
+        Returns None without changing anything while the file is still within
+        its grace period or referenced by a row not yet written.
+        """
+        refs = int(await self.redis.hget(pdf_storage.refs_key, file_id) or 0)
+        stored_at = await self.redis.zscore(self.recent_key, file_id)
+        if stored_at is not None and stored_at > time.time() - settings.STORAGE_ORPHAN_GRACE:
+            return None
+        if file_id in pending:
+            return None
+        rows = await client.generatedcontent.count(where={"type": "PDF", "filename": file_id})
+        if rows == refs and refs > 0:
+            return False
+        # Applied as a delta, in the same script that deletes at zero, so a
+        # concurrent put is never lost
+        return await pdf_storage.release(file_id, rows - refs)
+
+    async def _collect_orphans(self, client, pending: Set[str]) -> int:
+        """Reconcile PDFs stored more than the grace period ago."""
+        cutoff = time.time() - settings.STORAGE_ORPHAN_GRACE
+        file_ids = await self.redis.zrangebyscore(
+            self.recent_key, "-inf", cutoff, start=0, num=settings.STORAGE_GC_BATCH
+        )
+        deleted = 0
+        for file_id in file_ids:
+            result = await self._reconcile(client, file_id, pending)
+            if result is None:
+                # Rechecked on a later pass
+                continue
+            if result:
+                deleted += 1
+            await self._zrem_if_old(keys=[self.recent_key], args=[file_id, cutoff])
+        return deleted
+
+    async def _sweep_shard(self, client, pending: Set[str]) -> Tuple[int, int]:
+        """Walk the next shard: drop stale temp files, orphans and re-measure its usage."""
+        cursor = int(await self.redis.get(self.cursor_key) or 0) % SHARD_COUNT
+        shard = f"{cursor:02x}"
+        blobs, tmp_removed = await pdf_storage.scan(shard, settings.TEMP_FILE_MAX_AGE)
+
+        deleted = 0
+        size = count = 0
+        if blobs:
+            refs = await self.redis.hmget(pdf_storage.refs_key, [file_id for file_id, _, _ in blobs])
+            cutoff = time.time() - settings.STORAGE_ORPHAN_GRACE
+            for (file_id, blob_size, mtime), ref in zip(blobs, refs):
+                if int(ref or 0) <= 0 and mtime < cutoff and await self._reconcile(client, file_id, pending):
+                    deleted += 1
+                    continue
+                size += blob_size
+                count += 1
+        await pdf_storage.set_shard_usage(shard, size, count)
+        await self.redis.set(self.cursor_key, (cursor + 1) % SHARD_COUNT)
+        return deleted, tmp_removed
+
+    async def _expire_old_pdfs(self, client) -> int:
+        """Delete PDF content older than the retention period, a batch at a time."""
+        if settings.PDF_RETENTION_DAYS <= 0:
+            return 0
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.PDF_RETENTION_DAYS)
+        rows = await client.generatedcontent.find_many(
+            where={"type": "PDF", "createdAt": {"lt": cutoff}},
+            take=settings.STORAGE_GC_BATCH
+        )
+        if not rows:
+            return 0
+        # Imported here: content_service depends on this module
+        from .content_service import content_service
+
+        content_ids = [row.id for row in rows]
+        await client.generatedcontent.delete_many(where={"id": {"in": content_ids}})
+        # Same cleanup as ContentService.delete_content
+        await content_service.invalidate(content_ids)
+        for row in rows:
+            await search_service.remove(row.userId, row.id)
+            await content_bodies.delete(row.bodyRef)
+            if row.filename:
+                await self.release(row.userId, row.filename)
+        return len(rows)
+
+    async def run_once(self) -> Dict:
+        """Run one bounded maintenance pass."""
+        async with db.get_client() as client:
+            expired = await self._expire_old_pdfs(client)
+            pending = await self._pending_filenames()
+            orphans = await self._collect_orphans(client, pending)
+            shard_orphans, shard_tmp = await self._sweep_shard(client, pending)
+        temp_removed, temp_bytes = await asyncio.to_thread(
+            _sweep_temp, settings.TEMP_STORAGE_PATH, settings.TEMP_FILE_MAX_AGE, settings.STORAGE_GC_BATCH
+        )
+
+        result = {
+            "expired_deleted": expired,
+            "orphans_deleted": orphans + shard_orphans,
+            "temp_files_deleted": temp_removed + shard_tmp
+        }
+        for key, value in result.items():
+            self._stats[key] += value
+        self._stats["passes"] += 1
+        self._stats["temp_bytes"] = temp_bytes
+        self._stats["last_pass"] = time.time()
+        if any(result.values()):
+            logger.info(f"Storage maintenance: {result}")
+        return result
+
+    async def _run(self) -> None:
+        token = uuid.uuid4().hex
+        while True:
+            await asyncio.sleep(settings.STORAGE_GC_INTERVAL)
+            try:
+                if not await self.redis.set(self.lock_key, token, nx=True, ex=settings.STORAGE_GC_INTERVAL * 5):
+                    continue
+                try:
+                    await self.run_once()
+                finally:
+                    if await self.redis.get(self.lock_key) == token:
+                        await self.redis.delete(self.lock_key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Storage maintenance failed: {str(e)}")
+
+    def start(self) -> None:
+        """Start background maintenance in this process."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def metrics(self) -> Dict:
+        """Disk, blob and maintenance metrics for this node."""
+        return {
+            "backend": pdf_storage.backend.name,
+            "pdf": await pdf_storage.usage(),
+            "pdf_max_bytes": settings.PDF_STORAGE_MAX_BYTES,
+            "disk": await pdf_storage.disk_usage(),
+            "users": await self.redis.hlen(self.usage_key),
+            "gc": dict(self._stats)
+        }
+
+
+storage_manager = StorageManager()
@@ -0,0 +1,181 @@
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+
+DEFAULT_TITLE = "Generated Story"
+REPLACEMENT_CHAR = "\ufffd"
+
+
+def _hex4(text: str) -> Optional[int]:
+    """Value of a four-digit hex escape, or None if it is not one."""
+    if len(text) != 4 or not all(c in "0123456789abcdefABCDEF" for c in text):
+        return None
+    return int(text, 16)
+
+
+class StoryStreamParser:
+    """Incremental parser for a streamed ``{"title": ..., "content": ...}`` story.
+
+    Text is fed as it arrives from the model. The title is emitted once its
+    string closes, and the content is emitted paragraph by paragraph as each
+    blank-line separator is decoded, without waiting for the closing brace.
+    Text before the opening brace (such as a Markdown code fence) is ignored.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._raw: List[str] = []
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._expect_key = True
+        self._string_is_key = False
+        self._key: Optional[str] = None
+        self._chars: List[str] = []
+        self.title: Optional[str] = None
+        self.paragraphs: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """Consume more model output and return newly completed ``(kind, text)`` events."""
+        self._raw.append(text)
+        self._pending += text
+        events: List[Tuple[str, str]] = []
+        data = self._pending
+        i = 0
+        while i < len(data) and not self._finished:
+            ch = data[i]
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+                i += 1
+                continue
+
+            if self._in_string:
+                if ch == '\\':
+                    decoded, consumed = self._decode_escape(data, i)
+                    if consumed == 0:
+                        # Escape sequence split across chunks; wait for more input
+                        break
+                    self._append(decoded, events)
+                    i += consumed
+                    continue
+                if ch == '"':
+                    self._close_string(events)
+                else:
+                    self._append(ch, events)
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = self._depth == 1 and self._expect_key
+                self._chars = []
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finished = True
+            elif ch == ':' and self._depth == 1:
+                self._expect_key = False
+            elif ch == ',' and self._depth == 1:
+                self._expect_key = True
+                self._key = None
+            i += 1
+        self._pending = data[i:]
+        return events
+
+    def finish(self) -> List[Tuple[str, str]]:
+        """Flush anything left once the stream ends, falling back to plain text."""
+        events: List[Tuple[str, str]] = []
+        if self._in_string and self._key == "content":
+            self._emit_paragraph(events)
+        if not self._started or (self.title is None and not self.paragraphs):
+            # The model ignored the JSON format; treat the whole response as the story
+            logger.warning("Story response was not JSON, using raw text")
+            raw = "".join(self._raw)
+            self.paragraphs = []
+            for paragraph in raw.split('\n\n'):
+                if paragraph.strip():
+                    self.paragraphs.append(paragraph.strip())
+                    events.append(("paragraph", paragraph.strip()))
+        if self.title is None:
+            self.title = DEFAULT_TITLE
+            events.insert(0, ("title", self.title))
+        return events
+
+    @property
+    def content(self) -> str:
+        return "\n\n".join(self.paragraphs)
+
+    def _decode_escape(self, data: str, i: int) -> Tuple[str, int]:
+        """Decode the escape at ``data[i]``; returns consumed length 0 if incomplete."""
+        if i + 1 >= len(data):
+            return "", 0
+        code = data[i + 1]
+        if code != 'u':
+            return _ESCAPES.get(code, code), 2
+        if i + 6 > len(data):
+            return "", 0
+        value = _hex4(data[i + 2:i + 6])
+        if value is None:
+            # Malformed escape: replace just the backslash-u and parse the rest as text
+            return REPLACEMENT_CHAR, 2
+        if 0xD800 <= value < 0xDC00:
+            # High surrogate: combine with the following low surrogate
+            if i + 12 > len(data):
+                return "", 0
+            if data[i + 6:i + 8] == '\\u':
+                low = _hex4(data[i + 8:i + 12])
+                if low is not None and 0xDC00 <= low < 0xE000:
+                    return chr(0x10000 + ((value - 0xD800) << 10) + (low - 0xDC00)), 12
+        if 0xD800 <= value < 0xE000:
+            # Unpaired surrogate
+            return REPLACEMENT_CHAR, 6
+        return chr(value), 6
+
+    def _append(self, text: str, events: List[Tuple[str, str]]) -> None:
+        self._chars.append(text)
+        if (
+            self._key == "content"
+            and not self._string_is_key
+            and self._depth == 1
+            and text == '\n'
+            and len(self._chars) >= 2
+            and self._chars[-2] == '\n'
+        ):
+            self._emit_paragraph(events)
+
+    def _emit_paragraph(self, events: List[Tuple[str, str]]) -> None:
+        paragraph = "".join(self._chars).strip()
+        self._chars = []
+        if paragraph:
+            self.paragraphs.append(paragraph)
+            events.append(("paragraph", paragraph))
+
+    def _close_string(self, events: List[Tuple[str, str]]) -> None:
+        self._in_string = False
+        if self._depth != 1:
+            return
+        if self._string_is_key:
+            self._key = "".join(self._chars)
+        elif self._key == "title" and self.title is None:
+            self.title = "".join(self._chars).strip() or DEFAULT_TITLE
+            events.append(("title", self.title))
+        elif self._key == "content":
+            self._emit_paragraph(events)
+        self._chars = []
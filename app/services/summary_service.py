@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import logging
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
+import google.generativeai as genai
+from ..core.config import settings
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Separator placed between pages by the extractors
+PAGE_BREAK = "\f"
+
+# Rough characters-per-token ratio for Gemini models; avoids a count_tokens round trip
+CHARS_PER_TOKEN = 4
+
+ANALYSIS_INSTRUCTIONS = """
+            Please include:
+            1. The contents of the file you are analyzing
+            2. A summary of the main points
+            3. Key insights or observations
+            4. Any relevant recommendations
+            """
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a piece of text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class SummaryService:
+    def __init__(self):
+        self.cache = cache_service
+        logger.info("Summary Service initialized")
+
+    def split_text(self, text: str, max_tokens: Optional[int] = None) -> List[str]:
+        """Split text into chunks on page and paragraph boundaries within a token budget."""
+        max_chars = (max_tokens or settings.SUMMARY_CHUNK_TOKENS) * CHARS_PER_TOKEN
+        chunks = []
+        current: List[str] = []
+        current_len = 0
+
+        def flush():
+            nonlocal current, current_len
+            if current:
+                chunks.append("\n\n".join(current))
+            current, current_len = [], 0
+
+        for page in text.split(PAGE_BREAK):
+            for paragraph in re.split(r"\n\s*\n", page):
+                paragraph = paragraph.strip()
+                if not paragraph:
+                    continue
+                for piece in self._split_oversized(paragraph, max_chars):
+                    if current_len + len(piece) > max_chars:
+                        flush()
+                    current.append(piece)
+                    current_len += len(piece) + 2
+            # Prefer to start a new chunk at a page boundary once a chunk is well filled
+            if current_len > max_chars // 2:
+                flush()
+        flush()
+        return chunks
+
+    def _split_oversized(self, paragraph: str, max_chars: int) -> List[str]:
+        """Break a paragraph larger than the budget on sentence boundaries, then hard-wrap."""
+        if len(paragraph) <= max_chars:
+            return [paragraph]
+        pieces = []
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            while len(sentence) > max_chars:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                pieces.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def _cache_key(self, kind: str, model_name: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        return f"summary:{kind}:{model_name}:{digest}"
+
+    async def _generate(self, kind: str, prompt: str, cache_text: str, model_name: str) -> str:
+        """Run a single generation, reusing a cached result for identical input."""
+        cache_key = self._cache_key(kind, model_name, cache_text)
+        cached = await self.cache.get(cache_key)
+        if cached:
+            return cached
+
+        model = genai.GenerativeModel(model_name=model_name)
+        response = await model.generate_content_async(prompt)
+        if not response.text:
+            raise ValueError("AI model returned empty response")
+
+        await self.cache.set(cache_key, response.text, settings.SUMMARY_CACHE_TTL)
+        return response.text
+
+    async def _summarize_chunk(self, chunk: str, index: int, total: int, model_name: str) -> str:
+        prompt = f"""
+            The following is part {index + 1} of {total} of a larger document.
+            Summarize it, preserving names, figures, dates and any facts needed to
+            analyze the full document later:
+            {chunk}
+            """
+        # Position is excluded from the cache key so edits elsewhere in the document keep this entry
+        return await self._generate("chunk", prompt, chunk, model_name)
+
+    async def _combine(self, summaries: List[str], model_name: str, final: bool) -> str:
+        joined = "\n\n".join(f"Section {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+        if final:
+            prompt = f"""
+            The following are summaries of consecutive sections of one document.
+            Analyze the document as a whole and provide a detailed response:
+            {joined}
+            {ANALYSIS_INSTRUCTIONS}
+            """
+        else:
+            prompt = f"""
+            The following are summaries of consecutive sections of one document.
+            Merge them into a single summary, keeping the important details:
+            {joined}
+            """
+        return await self._generate("final" if final else "combine", prompt, joined, model_name)
+
+    async def _reduce(self, summaries: List[str], model_name: str) -> str:
+        """Combine partial summaries hierarchically until one fits the budget."""
+        budget = settings.SUMMARY_CHUNK_TOKENS
+        while sum(estimate_tokens(s) for s in summaries) > budget and len(summaries) > 1:
+            groups: List[List[str]] = [[]]
+            group_tokens = 0
+            for summary in summaries:
+                tokens = estimate_tokens(summary)
+                if groups[-1] and group_tokens + tokens > budget:
+                    groups.append([])
+                    group_tokens = 0
+                groups[-1].append(summary)
+                group_tokens += tokens
+            if len(groups) == len(summaries):
+                # Each summary alone fills the budget; pair them so the tree still shrinks
+                groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+
+            semaphore = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+
+            async def combine(group: List[str]) -> str:
+                async with semaphore:
+                    return await self._combine(group, model_name, final=False)
+
+            summaries = await asyncio.gather(*(combine(group) for group in groups))
+        return await self._combine(summaries, model_name, final=True)
+
+    async def summarize_stream(self, text: str, model_name: str) -> AsyncIterator[Dict[str, Any]]:
+        """Map-reduce summarize a document, yielding chunk summaries as they finish.
+
+        Yields ``{"type": "chunk", ...}`` events in completion order, then a single
+        ``{"type": "final", "summary": ...}`` event.
+        """
+        chunks = self.split_text(text)
+        total = len(chunks)
+        logger.info(f"Summarizing document in {total} chunks")
+        semaphore = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+
+        async def summarize(index: int, chunk: str):
+            async with semaphore:
+                return index, await self._summarize_chunk(chunk, index, total, model_name)
+
+        tasks = [asyncio.create_task(summarize(i, chunk)) for i, chunk in enumerate(chunks)]
+        summaries: List[Optional[str]] = [None] * total
+        try:
+            for completed in asyncio.as_completed(tasks):
+                index, summary = await completed
+                summaries[index] = summary
+                yield {"type": "chunk", "index": index, "total": total, "summary": summary}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        yield {"type": "final", "summary": await self._reduce(summaries, model_name)}
+
+    async def summarize(self, text: str, model_name: str) -> str:
+        """Map-reduce summarize a document and return the final analysis."""
+        final = None
+        async for event in self.summarize_stream(text, model_name):
+            if event["type"] == "final":
+                final = event["summary"]
+        return final
+
+
+summary_service = SummaryService()
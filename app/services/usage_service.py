@@ -0,0 +1,113 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+from ..core.config import settings
+from .cache_service import cache_service
+from .summary_service import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Counter fields kept in every hash; content types are counted under their lowercase name
+USAGE_FIELDS = ["chat", "voice", "file", "pdf", "tokens", "bytes"]
+
+# Text sent to the model, by content type, besides the row's prompt
+INPUT_METADATA_FIELDS = ("query", "transcription", "original_content")
+
+
+class UsageService:
+    """Per-user usage counters, maintained as content is saved.
+
+    Each save increments three Redis hashes in one round trip: the user's
+    running totals, the current UTC hour and the current UTC day. Buckets
+    expire after ``USAGE_HOURLY_RETENTION`` hours and ``USAGE_DAILY_RETENTION``
+    days, so reads touch a fixed number of small hashes rather than
+    counting rows.
+    """
+
+    prefix = "usage"
+
+    def __init__(self):
+        self.redis = cache_service.redis
+        logger.info("Usage Service initialized")
+
+    def _totals_key(self, user_id: str) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def _hour_key(self, user_id: str, at: datetime) -> str:
+        return f"{self.prefix}:{user_id}:h:{at:%Y%m%d%H}"
+
+    def _day_key(self, user_id: str, at: datetime) -> str:
+        return f"{self.prefix}:{user_id}:d:{at:%Y%m%d}"
+
+    @staticmethod
+    def measure(row: Dict) -> Dict[str, int]:
+        """Counter increments for one content row: its type, estimated tokens and text bytes."""
+        texts = [row["content"], row.get("prompt") or ""]
+        metadata = row.get("metadata")
+        if isinstance(metadata, dict):
+            texts += [metadata[field] for field in INPUT_METADATA_FIELDS if isinstance(metadata.get(field), str)]
+        texts = [text for text in texts if text]
+        return {
+            row["type"].lower(): 1,
+            "tokens": sum(estimate_tokens(text) for text in texts),
+            "bytes": sum(len(text.encode("utf-8")) for text in texts)
+        }
+
+    async def record(self, row: Dict) -> None:
+        """Count a saved content row. Failures are logged; saving never waits on them."""
+        user_id = row["userId"]
+        now = datetime.now(timezone.utc)
+        hour_key = self._hour_key(user_id, now)
+        day_key = self._day_key(user_id, now)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for field, amount in self.measure(row).items():
+                pipe.hincrby(self._totals_key(user_id), field, amount)
+                pipe.hincrby(hour_key, field, amount)
+                pipe.hincrby(day_key, field, amount)
+            pipe.expire(hour_key, settings.USAGE_HOURLY_RETENTION * 3600)
+            pipe.expire(day_key, settings.USAGE_DAILY_RETENTION * 86400)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error recording usage for user {user_id}: {str(e)}")
+
+    @staticmethod
+    def _counters(values: Dict[str, str]) -> Dict[str, int]:
+        return {field: int(values.get(field, 0)) for field in USAGE_FIELDS}
+
+    async def get_usage(self, user_id: str) -> Dict[str, int]:
+        """The user's running totals."""
+        return self._counters(await self.redis.hgetall(self._totals_key(user_id)))
+
+    async def get_stats(self, user_id: str, hours: int = 24, days: int = 30) -> Dict:
+        """Totals plus the last ``hours`` hourly and ``days`` daily buckets, newest first."""
+        if hours > settings.USAGE_HOURLY_RETENTION or days > settings.USAGE_DAILY_RETENTION:
+            raise ValueError(
+                f"Usage is kept for {settings.USAGE_HOURLY_RETENTION} hours "
+                f"and {settings.USAGE_DAILY_RETENTION} days"
+            )
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        hour_starts = [now - timedelta(hours=i) for i in range(hours)]
+        day_starts = [now.replace(hour=0) - timedelta(days=i) for i in range(days)]
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self._totals_key(user_id))
+        for start in hour_starts:
+            pipe.hgetall(self._hour_key(user_id, start))
+        for start in day_starts:
+            pipe.hgetall(self._day_key(user_id, start))
+        results = await pipe.execute()
+
+        hourly = results[1:1 + hours]
+        daily = results[1 + hours:]
+        return {
+            "totals": self._counters(results[0]),
+            "hourly": self._buckets(hour_starts, hourly),
+            "daily": self._buckets(day_starts, daily)
+        }
+
+    def _buckets(self, starts: List[datetime], values: List[Dict[str, str]]) -> List[Dict]:
+        return [{"start": start, **self._counters(value)} for start, value in zip(starts, values)]
+
+
+usage_service = UsageService()
@@ -0,0 +1,67 @@
+"""Background job worker pool.
+
+Run alongside the API with ``python -m app.worker``. Each process claims jobs
+from the shared queue and runs up to ``JOB_WORKER_CONCURRENCY`` at a time.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from .core.config import settings
+from .core.database import db
+from .services.content_service import content_service
+from .services.job_service import job_service
+from .services import job_handlers  # noqa: F401  (registers job handlers)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def _serve() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await db.connect()
+    try:
+        await job_service.run_worker(settings.JOB_WORKER_CONCURRENCY, stop)
+    finally:
+        # Write results still in the write-behind buffer before the process exits
+        await content_service.stop()
+        await db.disconnect()
+
+
+def _run_process() -> None:
+    asyncio.run(_serve())
+
+
+def main() -> None:
+    if settings.JOB_BACKEND == "local":
+        raise SystemExit("JOB_BACKEND=local runs jobs inside the API process; no worker needed")
+
+    processes = []
+    for i in range(settings.JOB_WORKER_PROCESSES):
+        process = multiprocessing.Process(target=_run_process, name=f"job-worker-{i}")
+        process.start()
+        processes.append(process)
+    logger.info(f"Started {len(processes)} job worker processes")
+
+    def _forward(signum, frame):
+        # Children finish their running jobs before exiting
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGINT, _forward)
+    signal.signal(signal.SIGTERM, _forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
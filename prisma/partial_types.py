@@ -0,0 +1,10 @@
+from prisma.models import GeneratedContent
+
+# History listings select only these fields, leaving content and metadata in the database
+GeneratedContent.create_partial(
+    "GeneratedContentSummary",
+    include=["id", "type", "title", "preview", "filename", "fileUrl", "userId", "createdAt", "updatedAt"]
+)
+
+# Search index reconciliation only needs the ids of a user's rows
+GeneratedContent.create_partial("GeneratedContentRef", include=["id"])